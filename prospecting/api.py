@@ -1,20 +1,33 @@
 
 from __future__ import print_function
-import httplib2
 import os
 import json
+import time
+import pickle
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 from apiclient import discovery
+from apiclient.errors import HttpError
 from oauth2client import client
 from oauth2client import tools
 from oauth2client.file import Storage
 
+import numpy as np
 import pandas as pd
+from itertools import zip_longest
 
+from prospecting.transport import http_pool, scheduler, is_retryable
+from prospecting.errors import ScopeError
+from prospecting import utils
 from prospecting.env import (PROJECTNAME,
                              CREDSDIR,
                              CLIENT_SECRET_FILE,
                              DATADIR,
+                             TMPDIR,
                              NOAUTH_LOCAL_WEBSERVER
                              )
 
@@ -29,6 +42,11 @@ except ImportError:
 import logging
 log = logging.getLogger('prospecting.api')
 
+# Process-wide registries shared by every GoogleApi instance
+_registry_lock = threading.RLock()
+_discovery_docs = {}  # {(apiname, apiversion): parsed discovery document}
+_service_objects = {}  # {(apiname, apiversion, credential_path, scopes): service object}
+
 
 class GoogleApi:
     """Base class for interfacing with Google APIs
@@ -59,13 +77,22 @@ class GoogleApi:
 
     def authenticate(self):
         log.info('Authenticating...{0}, {1}'.format(self.api_name, self.api_version))
-        self.credentials = self._get_credentials(self.api_scope)
-        self.http = self.credentials.authorize(httplib2.Http())
+        if http_pool.replaying:
+            log.info('Replaying recorded responses, skipping credentials')
+            self.credentials = None
+            self.credential_path = None
+        else:
+            self.credentials = self._get_credentials(self.api_scope)
+        self.http = http_pool.http(self.credentials)
         service = self._build_service_object()
         log.info('Successfully authenticated...{0}, {1}'.format(self.api_name, self.api_version))
         return service
 
     def reauthenticate(self, scopelist):
+        with _registry_lock:
+            for key in [key for key in _service_objects if key[2] == self.credential_path]:
+                del _service_objects[key]
+        credential_registry.discard(self.credential_path)
         if os.path.isfile(self.credential_path):
             os.remove(self.credential_path)
         self.api_scope = scopelist
@@ -76,20 +103,27 @@ class GoogleApi:
         credsfile = ('googleapis.' + self.api_name + '.' + PROJECTNAME + '.json')
         self.credential_path = os.path.join(CREDSDIR, credsfile)
         self.store = Storage(self.credential_path)
-        file_exists = os.path.isfile(self.credential_path)
-        scopes_match = False
-        if file_exists:
-            with open(self.credential_path) as f:
-                credjson = json.load(f)
-            scopes_match = set(credjson['scopes']) == set(scopelist)
-        if scopes_match:
-            creds = self.store.get()
-        else:
-            creds = None
-            if (not creds or creds.invalid):
-                creds = self._run_credentials_flow()
+        creds = credential_registry.get(self.credential_path, scopelist)
+        if (not creds or creds.invalid):
+            creds = self._run_credentials_flow()
+            credential_registry.put(self.credential_path, creds)
         return creds
 
+    def _execute(self, request, priority=None):
+        """Executes a request through the shared scheduler with an Http object leased from the shared pool
+
+        Params:
+            request (HttpRequest):  Request built from self.service
+            priority (str): 'interactive' or 'bulk', defaults to 'interactive' for reads and 'bulk' for writes
+
+        """
+        with http_pool.lease(self.credentials) as http:
+            return scheduler.execute(request,
+                                     http,
+                                     self.api_name,
+                                     user=getattr(self, 'credential_path', None),
+                                     priority=priority)
+
     def _run_credentials_flow(self):
         log.info('Running credentials flow...')
         secretspath = os.path.join(CREDSDIR, CLIENT_SECRET_FILE)
@@ -103,23 +137,54 @@ class GoogleApi:
         return self.credentials
 
     def _build_service_object(self):
-        log.info('Building service object...')
-        service_object = discovery.build(self.api_name,
-                                         self.api_version,
-                                         http=self.http,
-                                         discoveryServiceUrl=self.discovery_url)
+        key = (self.api_name, self.api_version, self.credential_path, tuple(sorted(self.api_scope)))
+        with _registry_lock:
+            service_object = _service_objects.get(key)
+            if service_object is not None:
+                log.info('Reusing service object...{0}'.format(service_object))
+                return service_object
+            log.info('Building service object...')
+            service_object = discovery.build_from_document(self.api_info, http=self.http)
+            _service_objects[key] = service_object
         log.info('Service object built...{0}'.format(service_object))
         return service_object
 
+    def write_compact_discovery(self):
+        """Writes a pickled copy of the discovery document with descriptions removed
+
+        When present, `discoveryapi_<apiname>.p` is read instead of the JSON discovery file,
+        which avoids parsing JSON and most of the document's text on cold start.
+
+        """
+        compact_file = os.path.join(DATADIR, 'discoveryapi_' + self.api_name + '.p')
+        with open(compact_file, 'wb') as outfile:
+            pickle.dump(_compact_discovery(self.api_info), outfile, pickle.HIGHEST_PROTOCOL)
+        log.info('Compact discovery file written to {0}'.format(compact_file))
+        return compact_file
+
     def _discover_api(self, discoveryurl):
+        with _registry_lock:
+            disco_info = _discovery_docs.get((self.api_name, self.api_version))
+            if disco_info is None:
+                disco_info = self._read_discovery_doc(discoveryurl)
+                _discovery_docs[(self.api_name, self.api_version)] = disco_info
+        return disco_info
+
+    def _read_discovery_doc(self, discoveryurl):
         discovery_file = os.path.join(DATADIR,
                                       'discoveryapi_' + self.api_name + '.json')
-        if os.path.isfile(discovery_file):
+        compact_file = os.path.join(DATADIR,
+                                    'discoveryapi_' + self.api_name + '.p')
+        if os.path.isfile(compact_file):
+            log.info(('Reading compact discovery file for {0}').format(self.api_id))
+            with open(compact_file, 'rb') as f:
+                disco_info = pickle.load(f)
+        elif os.path.isfile(discovery_file):
             log.info(('Reading discovery file for {0}').format(self.api_id))
             with open(discovery_file) as f:
                 disco_info = json.load(f)
         else:
-            h = httplib2.Http()
+            h = http_pool.http()
             resp, content = h.request(discoveryurl, 'GET')
             log.info(('Resp from 1st discoveryurl attempt: {0}'.format(resp['status'])))
             if resp['status'] == '404':
@@ -147,6 +212,213 @@ class GoogleApi:
         return disco_info
 
 
+class CredentialRegistry:
+    """Process-wide store of OAuth credentials with proactive token refresh
+
+    Each credential file is read once and its credentials object is shared by every GoogleApi
+    instance with matching scopes. Once credentials are handed out, a daemon thread refreshes any
+    access token expiring within `refreshmargin` seconds, so requests never wait on a refresh.
+
+    """
+
+    def __init__(self, refreshmargin=300, checkinterval=60):
+        """Initialize CredentialRegistry class
+
+        Args:
+            refreshmargin (int):    Seconds before expiry at which a token is refreshed, Ex: 300
+            checkinterval (int):    Seconds between expiry checks, Ex: 60
+
+        """
+        self.refresh_margin = refreshmargin
+        self.check_interval = checkinterval
+        self.credentials = {}  # {credential_path: credentials}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, credential_path, scopelist):
+        """Returns the credentials stored at `credential_path` if their scopes match `scopelist`, else None"""
+        with self._lock:
+            creds = self.credentials.get(credential_path)
+            if creds is None and os.path.isfile(credential_path):
+                creds = Storage(credential_path).get()
+                if creds is not None:
+                    self.credentials[credential_path] = creds
+        if creds is None or set(creds.scopes) != set(scopelist):
+            return None
+        self.start()
+        return creds
+
+    def put(self, credential_path, creds):
+        with self._lock:
+            self.credentials[credential_path] = creds
+        self.start()
+
+    def discard(self, credential_path):
+        with self._lock:
+            self.credentials.pop(credential_path, None)
+
+    def start(self):
+        """Starts the background refresh thread if it is not running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='prospecting-token-refresh')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh_expiring(self):
+        """Refreshes every access token expiring within the refresh margin, returns the number refreshed
+
+        Tokens without a known expiry (token_expiry None) are skipped; like oauth2client, they are
+        treated as unexpired and are refreshed by the authorized Http on a 401 response.
+
+        """
+        with self._lock:
+            items = list(self.credentials.items())
+        deadline = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.refresh_margin)
+        refreshed = 0
+        for credential_path, creds in items:
+            if creds.invalid or creds.token_expiry is None or creds.token_expiry > deadline:
+                continue
+            try:
+                with http_pool.lease() as http:
+                    creds.refresh(http)
+                refreshed += 1
+                log.debug('Refreshed access token for {0}'.format(credential_path))
+            except Exception as e:
+                log.warning('Background token refresh failed for {0}: {1}'.format(credential_path, e))
+        return refreshed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_expiring()
+            self._stop.wait(self.check_interval)
+
+
+credential_registry = CredentialRegistry()
+
+
+def _compact_discovery(doc, parentkey=None):
+    """Returns a copy of a discovery document without the 'description' text of methods and parameters"""
+    if isinstance(doc, dict):
+        # 'properties' and 'parameters' map names to definitions, a member may itself be called 'description'
+        return {k: _compact_discovery(v, k) for k, v in doc.items()
+                if not (k == 'description' and parentkey not in ('properties', 'parameters')
+                        and not isinstance(v, dict))}
+    if isinstance(doc, list):
+        return [_compact_discovery(v, parentkey) for v in doc]
+    return doc
+
+
+def values_to_dataframe(values, headerrow=0, schema=None, majordimension='ROWS'):
+    """Builds a DataFrame from Sheets values, one typed column at a time
+
+    Column-major values ('COLUMNS') are preferred: each column is converted with a single NumPy
+    operation and ragged columns (trailing blank cells are omitted by the API) are padded by
+    slice assignment, so no Python code runs per row. Row-major values are transposed first.
+
+    Params:
+        values (list):  'values' of a ValueRange response
+        headerrow (int):    Position of the header, None for a numbered header, Ex: 0
+        schema (dict):  Column dtypes, columns not listed stay object, Ex: {'n_employees': 'int64'}
+                        Integer columns with blank cells are returned as float64 with NaN,
+                        datetime64 columns are converted from SERIAL_NUMBER date values.
+                        A non-blank cell that is not a number in a numeric or datetime64
+                        column raises ValueError.
+        majordimension (str):   Major dimension of `values`, Ex: 'COLUMNS'
+
+    Returns:
+        DataFrame
+
+    """
+    if schema is None:
+        schema = {}
+    if majordimension == 'ROWS':
+        columns = [list(col) for col in zip_longest(*values)]
+    else:
+        columns = values
+    if headerrow is None:
+        header = list(range(len(columns)))
+        start = 0
+    else:
+        header = [col[headerrow] if len(col) > headerrow else '' for col in columns]
+        start = headerrow + 1
+    nrows = max([len(col) for col in columns] + [start]) - start
+    data = OrderedDict()
+    for name, col in zip(header, columns):
+        data[name] = _typed_column(col[start:], nrows, schema.get(name), name)
+    return pd.DataFrame(data, columns=header)
+
+
+def rows_to_dataframe(values, headerrow=0):
+    """Builds an untyped DataFrame from row-major Sheets values, keeping every row and cell
+
+    The API omits trailing blank cells, so rows can be shorter than the header (padded with None)
+    or, with cells beyond the last named column, longer (those columns are named by their letter).
+
+    Params:
+        values (list):  'values' of a ValueRange response, Ex: [['name', 'zip'], ['acme', '02139'], ['foo']]
+        headerrow (int):    Position of the header row, Ex: 0
+
+    Returns:
+        DataFrame
+
+    """
+    header = list(values[headerrow])
+    width = max(len(row) for row in values)
+    header += [_column_letter(i + 1) for i in range(len(header), width)]
+    rows = [list(row) + [None] * (width - len(row)) for row in values[(headerrow + 1):]]
+    return pd.DataFrame.from_records(rows, columns=header)
+
+
+def schema_from_metadata(metadata, namecol='column_name', dtypecol='dtype'):
+    """Returns a values_to_dataframe schema from a sheet listing column names and dtypes,
+    for example a description sheet made by report.create_description
+    """
+    rows = metadata[[namecol, dtypecol]].dropna()
+    return {name: dtype for name, dtype in zip(rows[namecol], rows[dtypecol]) if dtype}
+
+
+def _column_letter(n):
+    """Returns the A1 notation letters of the n-th column (1-based), Ex: 1 -> 'A', 28 -> 'AB'"""
+    letters = ''
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _typed_column(values, nrows, dtype, name=None):
+    arr = np.empty(nrows, dtype=object)
+    arr[:len(values)] = values
+    if dtype is None:
+        return arr
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'OSU':
+        return arr
+    if dtype.kind == 'b':
+        flags = pd.Series(arr).map({True: True, False: False, 'TRUE': True, 'FALSE': False})
+        return flags.values.astype(bool) if flags.notnull().all() else arr
+    nums = pd.to_numeric(arr, errors='coerce')
+    coerced = np.isnan(nums.astype(float)) & ~(pd.isnull(arr) | (arr == ''))
+    if coerced.any():
+        raise ValueError('Column {0} has {1} values that are not numbers, expected {2}, Ex: {3}'.format(
+            name, coerced.sum(), dtype, list(arr[coerced][:3])))
+    if dtype.kind == 'M':
+        missing = np.isnan(nums)
+        nanos = np.where(missing, 0, np.round(nums * 86400e9)).astype('int64').astype('timedelta64[ns]')
+        dates = np.datetime64('1899-12-30', 'ns') + nanos
+        dates[missing] = np.datetime64('NaT')
+        return dates
+    if dtype.kind in 'iu' and np.isnan(nums.astype(float)).any():
+        return nums.astype(float)
+    return nums.astype(dtype)
+
+
 class SheetsApi(GoogleApi):
     """Class for SheetsApi object
 
@@ -167,6 +439,8 @@ class SheetsApi(GoogleApi):
         self.sheet_range = sheetrange
         self.info = None  # reserved for metadata
         self.sheets = {}  # store data from get requests
+        self.buffer = None  # active SheetsWriteBuffer, see write_buffer()
+        self.cache = None  # optional ValueRangeCache for get and batchGet
         GoogleApi.__init__(self, apiname, apiversion, scopelist)
         pass
 
@@ -201,19 +475,19 @@ class SheetsApi(GoogleApi):
         if sheetranges is None:
             if spreadsheetid is None:
                 raise ValueError('Please set self.spreadsheet_id')
-            response = self.service.spreadsheets().get(
+            response = self._execute(self.service.spreadsheets().get(
                 spreadsheetId=spreadsheetid,
                 includeGridData=includegriddata
-            ).execute()
+            ))
             log.info('Spreadsheet loaded.')
             log.info('Sheets include: {0}'.format([sheet['properties']['title'] for sheet in response['sheets']]))
             return response
         else:
-            response = self.service.spreadsheets().get(
+            response = self._execute(self.service.spreadsheets().get(
                 spreadsheetId=spreadsheetid,
                 ranges=sheetranges,
                 includeGridData=includegriddata
-            ).execute()
+            ))
             return response
 
     def get(self,
@@ -222,7 +496,8 @@ class SheetsApi(GoogleApi):
             headerrow=0,
             majordimension='ROWS',
             valuerenderoption='FORMATTED_VALUE',
-            datetimerenderoption='SERIAL_NUMBER'):
+            datetimerenderoption='SERIAL_NUMBER',
+            schema=None):
         """Returns one range of values from a spreadsheet.
 
         Params:
@@ -233,6 +508,9 @@ class SheetsApi(GoogleApi):
             valuerenderoption (str): How values should be represented in the output, Ex: 'UNFORMATTED_VALUE'
             datetimerenderoption (str): How dates, times, and durations should be represented in the output,
                                         Ex: 'FORMATTED_STRING'
+            schema (dict):  Column dtypes, when set values are requested as unformatted columns and each
+                            column is built directly in its dtype, see values_to_dataframe,
+                            Ex: {'zip': 'object', 'n_employees': 'int64', 'revenue': 'float64'}
 
         Returns:
             Google Sheet as requested
@@ -246,17 +524,31 @@ class SheetsApi(GoogleApi):
             raise ValueError('Please set self.spreadsheet_id')
         if not sheetrange:
             sheetrange = self.sheet_range
-        self.response = self.service.spreadsheets().values().get(
-            spreadsheetId=spreadsheetid,
-            range=sheetrange,
-            majorDimension=majordimension,
-            valueRenderOption=valuerenderoption,
-            dateTimeRenderOption=datetimerenderoption
-        ).execute()
+        if schema is not None and asdataframe is True:
+            majordimension = 'COLUMNS'
+            valuerenderoption = 'UNFORMATTED_VALUE'
+
+        def request():
+            return self._execute(self.service.spreadsheets().values().get(
+                spreadsheetId=spreadsheetid,
+                range=sheetrange,
+                majorDimension=majordimension,
+                valueRenderOption=valuerenderoption,
+                dateTimeRenderOption=datetimerenderoption
+            ))
+
+        if self.cache is not None:
+            key = self.cache.make_key(spreadsheetid, 'get', sheetrange,
+                                      majordimension, valuerenderoption, datetimerenderoption)
+            self.response = self.cache.fetch(spreadsheetid, key, request)
+        else:
+            self.response = request()
         values = self.response.get('values', None)
         if not values:
             log.info('No data found.')
             tmpdf = None
+        elif schema is not None and asdataframe is True:
+            tmpdf = values_to_dataframe(values, headerrow=headerrow, schema=schema, majordimension=majordimension)
         else:
             if headerrow is not None:
                 if asdataframe is True:
@@ -276,6 +568,79 @@ class SheetsApi(GoogleApi):
                     tmpdf = values[0:len(values)]
         return (tmpdf)
 
+    def get_sharded(self,
+                    sheetname,
+                    shardrows=20000,
+                    maxworkers=4,
+                    headerrow=0,
+                    valuerenderoption='FORMATTED_VALUE',
+                    datetimerenderoption='SERIAL_NUMBER',
+                    schema=None):
+        """Returns a whole sheet as a DataFrame, read as row-range shards fetched concurrently
+
+        The grid size is read with get_ss_info, the sheet is split into ranges of `shardrows` rows,
+        Ex: 'predictions'!A1:Z20000, 'predictions'!A20001:Z40000, ..., and the shards are stitched
+        back together before the header row is applied once.
+
+        Params:
+            sheetname (str):    Title of the sheet to read, Ex: 'predictions'
+            shardrows (int):    Rows per request, Ex: 20000
+            maxworkers (int):   Maximum number of concurrent requests, Ex: 4
+            headerrow (int):    Specifies location of header, Ex: 0
+            valuerenderoption (str): How values should be represented in the output, Ex: 'UNFORMATTED_VALUE'
+            datetimerenderoption (str): How dates, times, and durations should be represented in the output,
+                                        Ex: 'FORMATTED_STRING'
+            schema (dict):  Column dtypes, see values_to_dataframe, values are requested unformatted when set
+
+        Returns:
+            DataFrame, or None if the sheet is empty
+
+        """
+        spreadsheetid = self.spreadsheet_id
+        if spreadsheetid is None:
+            raise ValueError('Please set self.spreadsheet_id')
+        if schema is not None:
+            valuerenderoption = 'UNFORMATTED_VALUE'
+        info = self.get_ss_info()
+        properties = [sheet['properties'] for sheet in info['sheets'] if sheet['properties']['title'] == sheetname]
+        if not properties:
+            raise ValueError('Sheet {0} not found in spreadsheet {1}'.format(sheetname, spreadsheetid))
+        grid = properties[0]['gridProperties']
+        rowcount, lastcol = grid['rowCount'], _column_letter(grid['columnCount'])
+        title = "'{0}'".format(sheetname.replace("'", "''"))
+        starts = list(range(1, rowcount + 1, shardrows))
+        ranges = ['{0}!A{1}:{2}{3}'.format(title, start, lastcol, min(start + shardrows - 1, rowcount))
+                  for start in starts]
+        log.info('Reading {0} rows of {1} in {2} shards...'.format(rowcount, sheetname, len(ranges)))
+
+        def fetch(sheetrange):
+            return self._execute(self.service.spreadsheets().values().get(
+                spreadsheetId=spreadsheetid,
+                range=sheetrange,
+                majorDimension='ROWS',
+                valueRenderOption=valuerenderoption,
+                dateTimeRenderOption=datetimerenderoption
+            )).get('values', [])
+
+        with ThreadPoolExecutor(max_workers=max(1, min(maxworkers, len(ranges)))) as executor:
+            shards = list(executor.map(fetch, ranges))
+        values = []
+        for i, shard in enumerate(shards):
+            values.extend(shard)
+            if i < len(shards) - 1:
+                # the API drops trailing blank rows, keep row positions aligned with the next shard
+                values.extend([[]] * (min(shardrows, rowcount - starts[i] + 1) - len(shard)))
+        while values and not values[-1]:
+            values.pop()
+        if not values:
+            log.info('No data found.')
+            return None
+        if schema is not None:
+            return values_to_dataframe(values, headerrow=headerrow, schema=schema)
+        if headerrow is None:
+            return pd.DataFrame.from_records(values)
+        return rows_to_dataframe(values, headerrow=headerrow)
+
     def batchGet(self,
                  sheetranges,
                  majordimension='ROWS',
@@ -302,18 +667,39 @@ class SheetsApi(GoogleApi):
             raise ValueError('Please set self.spreadsheet_id')
         if not sheetranges:
             sheetranges = self.sheet_range
-        self.response = self.service.spreadsheets().values().batchGet(
-            spreadsheetId=spreadsheetid,
-            ranges=sheetranges,
-            majorDimension=majordimension,
-            valueRenderOption=valuerenderoption,
-            dateTimeRenderOption=datetimerenderoption
-        ).execute()
+        self.response = self._batch_get(spreadsheetid,
+                                        sheetranges,
+                                        majordimension,
+                                        valuerenderoption,
+                                        datetimerenderoption)
         values = {vr['range']: vr.get('values', []) for vr in self.response['valueRanges']}
         if not values:
             print('No data found.')
         return {k: v for k, v in values.items()}
 
+    def _batch_get(self,
+                   spreadsheetid,
+                   sheetranges,
+                   majordimension='ROWS',
+                   valuerenderoption='FORMATTED_VALUE',
+                   datetimerenderoption='SERIAL_NUMBER'):
+        """Sends a values.batchGet request and returns the raw response, safe to call from worker threads"""
+
+        def request():
+            return self._execute(self.service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheetid,
+                ranges=sheetranges,
+                majorDimension=majordimension,
+                valueRenderOption=valuerenderoption,
+                dateTimeRenderOption=datetimerenderoption
+            ))
+
+        if self.cache is not None:
+            key = self.cache.make_key(spreadsheetid, 'batchGet', sheetranges,
+                                      majordimension, valuerenderoption, datetimerenderoption)
+            return self.cache.fetch(spreadsheetid, key, request)
+        return request()
+
     def update(self,
                dataframe,
                sheetrange,
@@ -359,6 +745,9 @@ class SheetsApi(GoogleApi):
         https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/update
 
         """
+        if self.buffer is not None:
+            self.buffer.update(dataframe, sheetrange, majordimension)
+            return
         spreadsheetid = self.spreadsheet_id
         data = {
             "range": sheetrange,
@@ -366,7 +755,7 @@ class SheetsApi(GoogleApi):
             "values":
                 [(dataframe.columns.values.tolist())] + (dataframe.values.tolist())
         }
-        self.response = self.service.spreadsheets().values().update(
+        self.response = self._execute(self.service.spreadsheets().values().update(
             spreadsheetId=spreadsheetid,
             range=sheetrange,
             valueInputOption=valueinputoption,
@@ -374,20 +763,118 @@ class SheetsApi(GoogleApi):
             #responseValueRenderOption=responsevaluerenderoption,
             #responseDateTimeRenderOption=responsedatetimerenderoption,
             body=data
-        ).execute()
+        ))
         if not self.response:
             log.info('Update Failed!')
         else:
             log.info('Update Successful!')
 
-    def batchUpdate(self,):
-        pass
+    def batchUpdate(self,
+                    data,
+                    valueinputoption='RAW'):
+        """Sets values in one or more ranges of a spreadsheet
 
-    def clear(self):
-        pass
+        Params:
+            data (list):    List of ValueRange dicts,
+                            Ex: [{'range': 'cv_results', 'majorDimension': 'ROWS', 'values': [['a', 'b'], [1, 2]]}]
+            valueinputoption (str): How the input data should be interpreted, Ex: 'USER_ENTERED'
 
-    def batchClear(self):
-        pass
+        Returns:
+            response, returns "BatchUpdateValuesResponse" in format:
+                {
+                  "spreadsheetId": string,
+                  "totalUpdatedRows": number,
+                  "totalUpdatedColumns": number,
+                  "totalUpdatedCells": number,
+                  "totalUpdatedSheets": number,
+                  "responses": [
+                    object(UpdateValuesResponse)
+                  ],
+                }
+
+        https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchUpdate
+
+        """
+        spreadsheetid = self.spreadsheet_id
+        if spreadsheetid is None:
+            raise ValueError('Please set self.spreadsheet_id')
+        self.response = self._execute(self.service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheetid,
+            body={"valueInputOption": valueinputoption, "data": data}
+        ))
+        log.info('Batch update of {0} ranges successful!'.format(len(data)))
+        return self.response
+
+    def clear(self, sheetrange):
+        """Clears values from a range of a spreadsheet, formatting is kept
+
+        Params:
+            sheetrange (str): The A1 notation of the range to clear, Ex: 'cv_results!A2:Z'
+
+        Returns:
+            response, returns "ClearValuesResponse" in format:
+                {
+                  "spreadsheetId": string,
+                  "clearedRange": string,
+                }
+
+        https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/clear
+
+        """
+        if self.buffer is not None:
+            self.buffer.clear(sheetrange)
+            return
+        spreadsheetid = self.spreadsheet_id
+        if spreadsheetid is None:
+            raise ValueError('Please set self.spreadsheet_id')
+        self.response = self._execute(self.service.spreadsheets().values().clear(
+            spreadsheetId=spreadsheetid,
+            range=sheetrange,
+            body={}
+        ))
+        log.info('Cleared {0}'.format(self.response.get('clearedRange')))
+        return self.response
+
+    def batchClear(self, sheetranges):
+        """Clears values from one or more ranges of a spreadsheet, formatting is kept
+
+        Params:
+            sheetranges (list): List of ranges in A1 notation, Ex: ['cv_results', 'session_report!A2:Z']
+
+        Returns:
+            response, returns "BatchClearValuesResponse" in format:
+                {
+                  "spreadsheetId": string,
+                  "clearedRanges": [
+                    string
+                  ],
+                }
+
+        https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchClear
+
+        """
+        spreadsheetid = self.spreadsheet_id
+        if spreadsheetid is None:
+            raise ValueError('Please set self.spreadsheet_id')
+        self.response = self._execute(self.service.spreadsheets().values().batchClear(
+            spreadsheetId=spreadsheetid,
+            body={"ranges": sheetranges}
+        ))
+        log.info('Cleared {0}'.format(self.response.get('clearedRanges')))
+        return self.response
+
+    def write_buffer(self, maxrows=10000, maxdelay=30.0):
+        """Returns a SheetsWriteBuffer which queues this object's update, append and clear calls
+
+        Use as a context manager, queued writes are flushed when the block exits. Pass
+        maxdelay=None to flush only on size and exit:
+
+            with ss.write_buffer():
+                ss.append(df_cv_results, 'cv_results')
+                ss.append(df_session_report, 'session_report')
+
+        """
+        return SheetsWriteBuffer(self, maxrows=maxrows, maxdelay=maxdelay)
 
     def append(self,
                dataframe,
@@ -427,44 +914,495 @@ class SheetsApi(GoogleApi):
         https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/append
 
         """
-        spreadsheetid = self.spreadsheet_id
+        if self.buffer is not None:
+            self.buffer.append(dataframe, sheetrange)
+            return
+        self.response = self._append_values(dataframe.values.tolist(), sheetrange, majordimension)
+        if not self.response:
+            log.info('No data found.')
+        else:
+            log.info('Append Successful!')
+
+    def _append_values(self,
+                       values,
+                       sheetrange,
+                       majordimension='ROWS',
+                       valueinputoption='RAW'):
+        """Sends a values.append request for a list of rows and returns the raw response"""
         data = {
             "range": sheetrange,
             "majorDimension": majordimension,
-            "values": dataframe.values.tolist()
-            #[(dataframe.columns.values.tolist())] + (dataframe.values.tolist())
+            "values": values
         }
-        self.response = self.service.spreadsheets().values().append(
-            spreadsheetId=spreadsheetid,
+        return self._execute(self.service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
             range=sheetrange,
-            valueInputOption='RAW',
+            valueInputOption=valueinputoption,
             body=data
-        ).execute()
-        if not self.response:
-            log.info('No data found.')
+        ))
+
+    def stream_append(self,
+                      dataframe,
+                      sheetrange,
+                      maxbytes=1000000,
+                      maxinflight=1,
+                      startrow=0,
+                      chunkrows=None,
+                      chunks=None,
+                      majordimension='ROWS',
+                      valueinputoption='RAW',
+                      insertdataoption='INSERT_ROWS'):
+        """Append a large DataFrame to a spreadsheet in row chunks sized by a byte budget
+
+        Chunks are serialized one at a time, right before they are sent, so memory use is bounded
+        by `maxinflight` chunks regardless of the size of the DataFrame. If a chunk fails no further
+        chunks are sent, but chunks already in flight still complete. The result reports exactly which
+        chunks succeeded, failed or were never sent, and `resume` holds the arguments that send only
+        the missing chunks, Ex: ss.stream_append(df, 'predictions', **result['resume'])
+
+        Params:
+            dataframe (DataFrame):  Rows to append, the header row is not written
+            sheetrange (str):   The A1 notation of a range to search for a logical table of data, Ex: 'predictions'
+            maxbytes (int): Approximate JSON payload size of each request, Ex: 1000000
+            maxinflight (int):  Number of requests sent concurrently. Values above 1 do not guarantee
+                                chunks land in the sheet in row order, Ex: 1
+            startrow (int): Positional row of `dataframe` to start from, Ex: 20000
+            chunkrows (int):    Rows per chunk, estimated from `maxbytes` if None, Ex: 5000
+            chunks (list):  Chunk numbers to send, all chunks if None, Ex: [3, 4, 5]
+            valueinputoption (str): How the input data should be interpreted, Ex: 'USER_ENTERED'
+            insertdataoption (str): How the input data should be inserted, Example 'OVERWRITE'
+
+        Returns:
+            Dict in format:
+                {
+                  "results": [{"chunk": int, "startrow": int, "stoprow": int,
+                               "response": AppendValuesResponse or None, "error": Exception or None}, ...],
+                  "succeeded": [int, ...],
+                  "failed": [int, ...],
+                  "unsent": [int, ...],
+                  "resume_row": int,
+                  "resume": {"startrow": int, "chunkrows": int, "chunks": [int, ...]} or None
+                }
+            `results` has one entry per chunk sent, ordered by chunk. `resume_row` is the first
+            positional row not known to be in the sheet; rows after it may already have been appended
+            by chunks in `succeeded`, so resume with `resume` rather than `startrow=resume_row`.
+
+        """
+        spreadsheetid = self.spreadsheet_id
+        if spreadsheetid is None:
+            raise ValueError('Please set self.spreadsheet_id')
+        nrows = dataframe.shape[0]
+        if startrow >= nrows:
+            log.info('No rows to append.')
+            return {'results': [], 'succeeded': [], 'failed': [], 'unsent': [], 'resume_row': nrows, 'resume': None}
+        if chunkrows is None:
+            chunkrows = self._rows_per_chunk(dataframe.iloc[startrow:], maxbytes)
+        bounds = [(start, min(start + chunkrows, nrows)) for start in range(startrow, nrows, chunkrows)]
+        queue = list(range(len(bounds))) if chunks is None else sorted(set(chunks))
+        log.info('Appending {0} chunks of {1} rows to {2}...'.format(len(queue), chunkrows, sheetrange))
+
+        def send(chunk):
+            start, stop = bounds[chunk]
+            data = {
+                "range": sheetrange,
+                "majorDimension": majordimension,
+                "values": dataframe.iloc[start:stop].values.tolist()
+            }
+            return self._execute(self.service.spreadsheets().values().append(
+                spreadsheetId=spreadsheetid,
+                range=sheetrange,
+                valueInputOption=valueinputoption,
+                insertDataOption=insertdataoption,
+                body=data
+            ))
+
+        results = {}
+        pending = {}
+        nextchunk = 0
+        failed = False
+        with ThreadPoolExecutor(max_workers=max(1, maxinflight)) as executor:
+            while pending or (nextchunk < len(queue) and not failed):
+                while not failed and nextchunk < len(queue) and len(pending) < max(1, maxinflight):
+                    pending[executor.submit(send, queue[nextchunk])] = queue[nextchunk]
+                    nextchunk += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = pending.pop(future)
+                    start, stop = bounds[chunk]
+                    result = {'chunk': chunk, 'startrow': start, 'stoprow': stop, 'response': None, 'error': None}
+                    try:
+                        result['response'] = future.result()
+                    except Exception as e:
+                        log.error('Append failed for chunk {0}, rows {1}:{2}: {3}'.format(chunk, start, stop, e))
+                        result['error'] = e
+                        failed = True
+                    results[chunk] = result
+        results = [results[chunk] for chunk in sorted(results)]
+        succeeded = [result['chunk'] for result in results if result['error'] is None]
+        failures = [result['chunk'] for result in results if result['error'] is not None]
+        unsent = queue[nextchunk:]
+        missing = sorted(failures + unsent)
+        resume_row = bounds[missing[0]][0] if missing else nrows
+        resume = {'startrow': startrow, 'chunkrows': chunkrows, 'chunks': missing} if missing else None
+        if missing:
+            log.warning('Stream append stopped at row {0}: chunks {1} failed, {2} unsent, {3} succeeded.'.format(
+                resume_row, failures, len(unsent), len(succeeded)))
         else:
-            log.info('Append Successful!')
+            log.info('Append Successful! {0} chunks of {1} rows.'.format(len(succeeded), chunkrows))
+        return {'results': results, 'succeeded': succeeded, 'failed': failures, 'unsent': unsent,
+                'resume_row': resume_row, 'resume': resume}
+
+    def _rows_per_chunk(self, dataframe, maxbytes, samplesize=100):
+        """Estimates how many rows of `dataframe` fit in a request of `maxbytes` from a sample of rows"""
+        nrows = dataframe.shape[0]
+        step = max(1, nrows // samplesize)
+        sample = dataframe.iloc[::step].iloc[:samplesize].values.tolist()
+        if not sample:
+            return 1
+        rowbytes = len(json.dumps(sample, default=str)) / float(len(sample))
+        return max(1, int(maxbytes / (rowbytes * 1.2)))
 
     def extract_sheet_names(self):
         pass
 
-    def load_sheets(self, sheetslist, batch=None):
+    def load_sheets(self, sheetslist, batch=None, schemas=None):
+        """Loads sheets as DataFrames, header in the first row
+
+        Params:
+            sheetslist (list):  Names of sheets to load, Ex: ['session_report', 'cv_results']
+            batch (dict):   Row-major values keyed by range, as returned by batchGet, requested if None
+            schemas (dict): Column dtypes keyed by sheet name, sheets listed here are built with
+                            values_to_dataframe and, when `batch` is None, requested column-major
+                            as unformatted values; other sheets are requested as formatted strings,
+                            Ex: {'cv_results': {'mean_test_score': 'float64'}}
+
+        Returns:
+            dict of DataFrames keyed by sheet name
+
+        """
         data = {}
+        if schemas is None:
+            schemas = {}
+        typed = {}
         if batch is None:
-            batch = self.batchGet(sheetslist)
+            typedsheets = [s for s in sheetslist if s in schemas]
+            if typedsheets:
+                response = self._batch_get(self.spreadsheet_id, typedsheets, 'COLUMNS', 'UNFORMATTED_VALUE')
+                typed = {vr['range']: vr.get('values', []) for vr in response['valueRanges']}
+            untyped = [s for s in sheetslist if s not in schemas]
+            batch = self.batchGet(untyped) if untyped else {}
         for s in sheetslist:
+            if s in schemas and typed:
+                tmp = [value for key, value in typed.items() if s in key][0]
+                data[s] = values_to_dataframe(tmp, schema=schemas[s], majordimension='COLUMNS')
+                continue
             tmp = [value for key, value in batch.items() if s in key][0]
             if tmp is None:
                 data[s] = tmp
+            elif s in schemas:
+                data[s] = values_to_dataframe(tmp, schema=schemas[s])
             else:
                 try:
-                    data[s] = pd.DataFrame.from_records(tmp[1:len(tmp[1])],
-                                                        columns=tmp[0][0:len(tmp[1])])
+                    data[s] = rows_to_dataframe(tmp)
                 except:
                     log.warning('Failed to load dataframe, returning tmp')
                     data[s] = tmp
         return (data)
 
+    def sync_sheets(self, sheetslist, mirrordir=None, reset=False):
+        """Loads append-only sheets from a local Parquet mirror after fetching only their new rows
+
+        A row-count watermark is kept per sheet. Each call sends one batchGet for the rows below
+        every watermark, appends them to the sheet's mirror as a new Parquet part, and returns the
+        mirror, so load time depends on the number of new rows rather than the whole history.
+        Meant for tabs that only grow, like session_report and cv_results; rows edited above the
+        watermark are not picked up, pass reset=True to rebuild a mirror. Values are kept as strings.
+
+        Params:
+            sheetslist (list):  Names of sheets to sync, Ex: ['session_report', 'cv_results', 'model_types']
+            mirrordir (str):    Directory for the mirror, defaults to DATADIR/mirror/<spreadsheet_id>
+            reset (bool):   Discard existing mirrors and watermarks of these sheets, Ex: False
+
+        Returns:
+            dict of DataFrames keyed by sheet name
+
+        """
+        spreadsheetid = self.spreadsheet_id
+        if spreadsheetid is None:
+            raise ValueError('Please set self.spreadsheet_id')
+        if utils.pa is None:
+            raise ImportError('pyarrow is required for sync_sheets, install with `pip install pyarrow`')
+        mirrordir = mirrordir or os.path.join(DATADIR, 'mirror', spreadsheetid)
+        if not os.path.isdir(mirrordir):
+            os.makedirs(mirrordir)
+        state_path = os.path.join(mirrordir, 'watermarks.json')
+        state = {}
+        if os.path.isfile(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        for sheet in sheetslist:
+            sheetdir = os.path.join(mirrordir, sheet)
+            if reset or sheet not in state:
+                state.pop(sheet, None)
+                if os.path.isdir(sheetdir):
+                    for part in os.listdir(sheetdir):
+                        os.remove(os.path.join(sheetdir, part))
+        columncounts = {sheet['properties']['title']: sheet['properties']['gridProperties']['columnCount']
+                        for sheet in self.get_ss_info()['sheets']}
+        ranges = ["'{0}'!A{1}:{2}".format(sheet.replace("'", "''"),
+                                           state.get(sheet, {}).get('rows', 0) + 1,
+                                           _column_letter(columncounts[sheet]))
+                  for sheet in sheetslist]
+        response = self._batch_get(spreadsheetid, ranges)
+        data = {}
+        for sheet, valuerange in zip(sheetslist, response['valueRanges']):
+            values = valuerange.get('values', [])
+            sheetstate = state.setdefault(sheet, {'rows': 0, 'columns': None})
+            if sheetstate['columns'] is None:
+                if not values:
+                    data[sheet] = None
+                    continue
+                sheetstate['columns'] = values[0]
+                rows = values[1:]
+            else:
+                rows = values
+            columns = sheetstate['columns']
+            if rows:
+                ncols = len(columns)
+                rows = [(row + [None] * (ncols - len(row)))[:ncols] for row in rows]
+                schema = utils.pa.schema([(str(col), utils.pa.string()) for col in columns])
+                utils.write_parquet_part(pd.DataFrame.from_records(rows, columns=columns),
+                                         os.path.join(mirrordir, sheet),
+                                         schema=schema)
+            sheetstate['rows'] += len(values)
+            with open(state_path, 'w') as f:
+                json.dump(state, f)
+            log.info('Synced {0}: {1} new rows, watermark at row {2}'.format(sheet, len(rows), sheetstate['rows']))
+            sheetdir = os.path.join(mirrordir, sheet)
+            if os.path.isdir(sheetdir) and os.listdir(sheetdir):
+                data[sheet] = utils.read_parquet_dir(sheetdir)
+            else:
+                data[sheet] = pd.DataFrame(columns=columns)
+        return data
+
+    def load_spreadsheets(self, sheetsmap, maxworkers=4):
+        """Loads sheets from several spreadsheets concurrently
+
+        One batchGet request is sent per spreadsheet, with up to `maxworkers` requests in flight,
+        so total latency is close to a single round trip rather than one per spreadsheet.
+
+        Params:
+            sheetsmap (dict or list):   Sheet names keyed by spreadsheet id, or a list of
+                                        (spreadsheet_id, [sheet names]) pairs,
+                                        Ex: {'17R9V5...': ['metadata'], '1dG5lQ...': ['cv_results', 'model_types']}
+            maxworkers (int):   Maximum number of concurrent requests, Ex: 4
+
+        Returns:
+            dict of DataFrames keyed by spreadsheet id, then sheet name,
+            Ex: {'17R9V5...': {'metadata': DataFrame}, '1dG5lQ...': {'cv_results': DataFrame, ...}}
+
+        """
+        if hasattr(sheetsmap, 'items'):
+            pairs = list(sheetsmap.items())
+        else:
+            pairs = list(sheetsmap)
+        data = {}
+        if not pairs:
+            return data
+        log.info('Loading {0} spreadsheets with {1} workers...'.format(len(pairs), maxworkers))
+        with ThreadPoolExecutor(max_workers=max(1, min(maxworkers, len(pairs)))) as executor:
+            futures = {executor.submit(self._batch_get, spreadsheetid, sheetslist): (spreadsheetid, sheetslist)
+                       for spreadsheetid, sheetslist in pairs}
+            for future in as_completed(futures):
+                spreadsheetid, sheetslist = futures[future]
+                response = future.result()
+                batch = {vr['range']: vr.get('values', []) for vr in response['valueRanges']}
+                data.setdefault(spreadsheetid, {}).update(self.load_sheets(sheetslist, batch=batch))
+        log.info('Spreadsheets loaded: {0}'.format(list(data.keys())))
+        return (data)
+
+
+class SheetsWriteBuffer:
+    """Queues writes against a spreadsheet and sends them in as few requests as possible
+
+    A flush sends, in order: one values.batchClear for all queued clears, one values.batchUpdate
+    for all queued updates, and one values.append per target range with the queued rows of that
+    range concatenated. A later update to the same range replaces the queued one, and clearing a
+    range drops writes already queued for it.
+
+    The buffer flushes when `maxrows` rows are queued, when a write is queued more than `maxdelay`
+    seconds after the oldest queued write, and when the context manager exits. With maxdelay=None
+    the age of queued writes never triggers a flush.
+
+    """
+
+    def __init__(self, sheetsapi, maxrows=10000, maxdelay=30.0, valueinputoption='RAW'):
+        """Initialize SheetsWriteBuffer class
+
+        Args:
+            sheetsapi (SheetsApi):  Authenticated SheetsApi object to write with
+            maxrows (int):  Number of queued rows that triggers a flush, Ex: 10000
+            maxdelay (float):   Age in seconds of the oldest queued write that triggers a flush,
+                                None to disable, Ex: 30.0
+            valueinputoption (str): How the input data should be interpreted, Ex: 'USER_ENTERED'
+
+        """
+        self.ss = sheetsapi
+        self.max_rows = maxrows
+        self.max_delay = maxdelay
+        self.value_input_option = valueinputoption
+        self.clears = []
+        self.updates = OrderedDict()  # {sheetrange: ValueRange}
+        self.appends = OrderedDict()  # {sheetrange: [rows]}
+        self.n_rows = 0
+        self.first_queued = None
+        self.responses = []
+
+    def __enter__(self):
+        self.ss.buffer = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.ss.buffer = None
+        self.flush()
+        return False
+
+    def update(self, dataframe, sheetrange, majordimension='ROWS'):
+        values = [(dataframe.columns.values.tolist())] + (dataframe.values.tolist())
+        self.updates.pop(sheetrange, None)
+        self.updates[sheetrange] = {"range": sheetrange, "majorDimension": majordimension, "values": values}
+        self._queued(len(values))
+
+    def append(self, dataframe, sheetrange):
+        values = dataframe.values.tolist()
+        self.appends.setdefault(sheetrange, []).extend(values)
+        self._queued(len(values))
+
+    def clear(self, sheetrange):
+        self.updates.pop(sheetrange, None)
+        self.appends.pop(sheetrange, None)
+        if sheetrange not in self.clears:
+            self.clears.append(sheetrange)
+        self._queued(0)
+
+    def _queued(self, nrows):
+        now = time.time()
+        if self.first_queued is None:
+            self.first_queued = now
+        self.n_rows += nrows
+        if self.n_rows >= self.max_rows or (self.max_delay is not None and
+                                            (now - self.first_queued) >= self.max_delay):
+            self.flush()
+
+    def flush(self):
+        """Sends all queued writes, returns the list of responses"""
+        if not (self.clears or self.updates or self.appends):
+            return []
+        log.info('Flushing write buffer: {0} clears, {1} updates, {2} appends, {3} rows'.format(
+            len(self.clears), len(self.updates), len(self.appends), self.n_rows))
+        clears, updates, appends = self.clears, self.updates, self.appends
+        self.clears, self.updates, self.appends = [], OrderedDict(), OrderedDict()
+        self.n_rows = 0
+        self.first_queued = None
+        responses = []
+        if clears:
+            responses.append(self.ss._execute(self.ss.service.spreadsheets().values().batchClear(
+                spreadsheetId=self.ss.spreadsheet_id,
+                body={"ranges": clears}
+            )))
+        if updates:
+            responses.append(self.ss._execute(self.ss.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.ss.spreadsheet_id,
+                body={"valueInputOption": self.value_input_option, "data": list(updates.values())}
+            )))
+        for sheetrange, values in appends.items():
+            responses.append(self.ss._append_values(values,
+                                                    sheetrange,
+                                                    valueinputoption=self.value_input_option))
+        self.responses.extend(responses)
+        log.info('Write buffer flushed in {0} requests.'.format(len(responses)))
+        return responses
+
+
+class ValueRangeCache:
+    """On-disk cache of Sheets value responses, validated against the spreadsheet's Drive version
+
+    Responses are keyed by spreadsheet id, requested range(s) and render options. Before a cached
+    response is served, the spreadsheet's `version` and `modifiedTime` are read through DriveApi
+    (a metadata request, no values are read); any edit to the spreadsheet bumps its version, so
+    stale entries are never served. The least recently used entries are evicted once more than
+    `maxentries` are stored.
+
+    Example:
+        drive = DriveApi()
+        drive.authenticate()
+        ss.cache = ValueRangeCache(drive)
+        md = ss.get('metadata', headerrow=1)  # served from disk while the spreadsheet is unchanged
+
+    """
+
+    def __init__(self, driveapi, cachedir=None, maxentries=256):
+        """Initialize ValueRangeCache class
+
+        Args:
+            driveapi (DriveApi):    Authenticated DriveApi object used to read spreadsheet versions
+            cachedir (str): Directory to store responses in, defaults to TMPDIR/sheets_cache
+            maxentries (int):   Maximum number of responses kept on disk, Ex: 256
+
+        """
+        self.drive = driveapi
+        self.cache_dir = cachedir or os.path.join(TMPDIR, 'sheets_cache')
+        self.index = utils.LruIndex(self.cache_dir, maxentries=maxentries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(spreadsheetid, method, sheetranges, *options):
+        keyinfo = json.dumps([spreadsheetid, method, sheetranges] + list(options), sort_keys=True)
+        return hashlib.sha1(keyinfo.encode('utf-8')).hexdigest()
+
+    def current_version(self, spreadsheetid):
+        """Returns the spreadsheet's Drive version as a string, Ex: '1234|2016-12-01T17:20:43.107Z'"""
+        response = self.drive._execute(self.drive.service.files().get(
+            fileId=spreadsheetid,
+            fields='version,modifiedTime'
+        ))
+        return '{0}|{1}'.format(response.get('version'), response.get('modifiedTime'))
+
+    def fetch(self, spreadsheetid, key, request):
+        """Returns the cached response for `key` if the spreadsheet is unchanged, otherwise calls `request()`"""
+        version = self.current_version(spreadsheetid)
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is not None and entry['version'] == version:
+                path = self.index.path(key)
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        response = pickle.load(f)
+                    self.index.flush()
+                    self.hits += 1
+                    log.info('Serving cached values for {0} (version {1})'.format(spreadsheetid, version))
+                    return response
+        response = request()
+        with self._lock:
+            self.misses += 1
+            filename = key + '.p'
+            with open(os.path.join(self.cache_dir, filename), 'wb') as f:
+                pickle.dump(response, f, pickle.HIGHEST_PROTOCOL)
+            self.index.put(key, {'spreadsheet_id': spreadsheetid, 'version': version, 'file': filename})
+            self.index.flush()
+        return response
+
+    def invalidate(self, spreadsheetid=None):
+        """Removes cached responses for one spreadsheet, or every response if `spreadsheetid` is None"""
+        with self._lock:
+            keys = [key for key, entry in self.index.items()
+                    if spreadsheetid is None or entry['spreadsheet_id'] == spreadsheetid]
+            self.index.remove(*keys)
+            self.index.flush()
+        log.info('Invalidated {0} cached responses'.format(len(keys)))
+
 
 class DriveApi(GoogleApi):
     """Class for DriveApi object
@@ -475,6 +1413,12 @@ class DriveApi(GoogleApi):
 
     """
 
+    BATCH_LIMIT = 100  # maximum calls per Drive batch request
+    SCOPE_URL = 'https://www.googleapis.com/auth/'
+    CONTENT_SCOPES = ('drive', 'drive.readonly', 'drive.file')  # scopes that can read file content
+    WRITE_SCOPES = ('drive', 'drive.file')  # scopes that can create and copy files
+    METADATA_WRITE_SCOPES = ('drive', 'drive.file', 'drive.metadata')  # scopes that can update metadata
+
     def __init__(self,
                  apiname='drive',
                  apiversion='v3',
@@ -489,13 +1433,21 @@ class DriveApi(GoogleApi):
     def authenticate(self):
         self.service = GoogleApi.authenticate(self)
 
+    def _require_scope(self, scopes, method):
+        """Raises ScopeError unless the object was created with one of `scopes`, Ex: ('drive', 'drive.file')"""
+        if not any(self.SCOPE_URL + scope in self.api_scope for scope in scopes):
+            raise ScopeError('DriveApi.{0} needs one of the scopes {1}, this object has {2}. '
+                             'Create it with DriveApi(scopelist=[...]) and authenticate again.'.format(
+                                 method, [self.SCOPE_URL + scope for scope in scopes], self.api_scope))
+
     def list_files(self,
                    query,
                    corpusdomain='user',
                    space='drive',
                    pagesize=100,
                    orderby='name',
-                   pagetoken=None):
+                   pagetoken=None,
+                   fields=None):
         """Lists or searches files
 
         Params:
@@ -508,41 +1460,80 @@ class DriveApi(GoogleApi):
             pageSize: integer, The maximum number of files to return per page.
             orderBy: string, A comma-separated list of sort keys. Valid keys are 'createdTime', 'folder', 'modifiedByMeTime', 'modifiedTime', 'name', 'quotaBytesUsed', 'recency', 'sharedWithMeTime', 'starred', and 'viewedByMeTime'. Each key sorts ascending by default, but may be reversed with the 'desc' modifier. Example usage: ?orderBy=folder,modifiedTime desc,name. Please note that there is a current limitation for users with approximately one million files in which the requested sort order is ignored.
             pageToken: string, The token for continuing a previous list request on the next page. This should be set to the value of 'nextPageToken' from the previous response.
+            fields: string, File fields to return, Ex: 'id, name, mimeType'
 
         Returns:
-            object
+            list of file dicts, or None if no files match the query
 
         """
-        files = []
         log.info("Requesting files with {0}, {1}, {2}, {3}, {4}, {5}".format(
             query, corpusdomain, space, pagesize, orderby, pagetoken))
-        while self.service:
-            response = self.service.files().list(
+        files = list(self.iter_files(query,
+                                     corpusdomain=corpusdomain,
+                                     space=space,
+                                     pagesize=pagesize,
+                                     orderby=orderby,
+                                     pagetoken=pagetoken,
+                                     fields=fields))
+        if not files:
+            log.info('No files found matching query:  {0}'.format(query))
+            files = None
+        else:
+            log.info('File list received! Total files in list: {0}. Check the class instance attribute `driveapiobject.files` for file list.'.format(len(files)))
+        self.files = files
+        return files
+
+    def iter_files(self,
+                   query,
+                   corpusdomain='user',
+                   space='drive',
+                   pagesize=100,
+                   orderby='name',
+                   pagetoken=None,
+                   fields=None,
+                   prefetch=True):
+        """Lists or searches files, yielding files as pages arrive
+
+        While the caller processes one page, the next page is requested in the background,
+        so at most two pages are held in memory. Takes the same params as list_files.
+
+        Params:
+            fields: string, File fields to return, smaller projections cut payload size, Ex: 'id, name'
+            prefetch: bool, Request the next page while the current one is being consumed, Ex: True
+
+        Yields:
+            file dicts, Ex: {'id': '1MdZ...', 'name': 'data.csv.gz'}
+
+        """
+        listfields = None if fields is None else 'nextPageToken, files({0})'.format(fields)
+
+        def fetch(token):
+            return self._execute(self.service.files().list(
                 q=query,
                 corpus=corpusdomain,
                 spaces=space,
                 orderBy=orderby,
-                #fields='nextPageToken, files(id, name, mimeType)',
+                fields=listfields,
                 pageSize=pagesize,
-                pageToken=pagetoken
-            ).execute()
-            if response['files']:
-                for file in response.get('files', []):
-                    files.append(file)
-                    """
-                    filename = file.get('name')
-                    fileid = file.get('id')
-                    mimetype = file.get('mimeType')
-                    print('Found file: {0} ({1}) {2}'.format(filename, fileid, mimetype))
-                    """
+                pageToken=token
+            ))
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            response = fetch(pagetoken)
+            while True:
                 pagetoken = response.get('nextPageToken', None)
+                future = None
+                if executor is not None and pagetoken is not None:
+                    future = executor.submit(fetch, pagetoken)
+                for file in response.get('files', []):
+                    yield file
                 if pagetoken is None:
-                    log.info('File list received! Total files in list: {0}. Check the class instance attribute `driveapiobject.files` for file list.'.format(len(files)))
                     break
-            else:
-                log.info('No files found matching query:  {0}'.format(query))
-                files = None
-        return files
+                response = future.result() if future is not None else fetch(pagetoken)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
 
     def create(self,
                _body=None,
@@ -560,22 +1551,34 @@ class DriveApi(GoogleApi):
             ignoredefaultvis (bool):    Whether to ignore the domain's default visibility settings for the created file. Domain administrators can choose to make all uploaded files visible to the domain by default; this parameter bypasses that behavior for the request. Permissions are still inherited from parent folders.
             ocrlang (str):  A language hint for OCR processing during image import (ISO 639-1 code).
 
+        Needs one of WRITE_SCOPES, raises ScopeError otherwise.
+
         Returns:
             object
 
         https://developers.google.com/resources/api-libraries/documentation/drive/v3/python/latest/drive_v3.files.html#create
 
         """
-        pass
+        self._require_scope(self.WRITE_SCOPES, 'create')
+        return self._execute(self.service.files().create(
+            body=_body,
+            media_body=mediabody,
+            keepRevisionForever=keeprevforever,
+            useContentAsIndexableText=usecontentasidxtxt,
+            ignoreDefaultVisibility=ignoredefvis,
+            ocrLanguage=ocrlang
+        ))
 
     def get(self,
             fileid,
-            ackabuse=None):
+            ackabuse=None,
+            fields=None):
         """Get a file's metadata or content by ID
 
         Args:
             fileid: string, The ID of the file. (required)
             ackabuse: boolean, Whether the user is acknowledging the risk of downloading known malware or other abusive files. This is only applicable when alt=media.
+            fields: string, Fields to return, Ex: 'id, name, modifiedTime'
 
         Returns:
             dict object
@@ -583,29 +1586,261 @@ class DriveApi(GoogleApi):
         https://developers.google.com/resources/api-libraries/documentation/drive/v3/python/latest/drive_v3.files.html#get
 
         """
-
-        while self.service:
-            response = self.service.files().get(
-                fileId = fileid
-            ).execute()
+        response = self._execute(self.service.files().get(
+            fileId=fileid,
+            acknowledgeAbuse=ackabuse,
+            fields=fields
+        ))
         return (response)
 
+    def batch_get(self, fileids, fields=None):
+        """Get metadata for many files, packed into as few batch requests as possible
+
+        Args:
+            fileids: list of file IDs
+            fields: string, Fields to return for each file, Ex: 'id, name, modifiedTime'
+
+        Returns:
+            OrderedDict of {fileid: metadata dict}, or {fileid: HttpError} for failed requests
+
+        """
+        requests = [(fileid, self.service.files().get(fileId=fileid, fields=fields)) for fileid in fileids]
+        return self._execute_batch(requests)
+
+    def batch_update(self, updates, addparents=None, removeparents=None):
+        """Update metadata of many files with patch semantics, packed into batch requests
+
+        Args:
+            updates: dict of {fileid: request body}, Ex: {'1MdZ...': {'name': 'predictions_2016'}}
+            addparents: string, A comma-separated list of parent IDs to add to every file
+            removeparents: string, A comma-separated list of parent IDs to remove from every file
+
+        Needs one of METADATA_WRITE_SCOPES, raises ScopeError before any request otherwise.
+
+        Returns:
+            OrderedDict of {fileid: file dict}, or {fileid: HttpError} for failed requests
+
+        """
+        self._require_scope(self.METADATA_WRITE_SCOPES, 'batch_update')
+        requests = [(fileid, self.service.files().update(fileId=fileid,
+                                                         body=body,
+                                                         addParents=addparents,
+                                                         removeParents=removeparents))
+                    for fileid, body in updates.items()]
+        return self._execute_batch(requests)
+
+    def batch_copy(self, fileids, _body=None):
+        """Copy many files, packed into batch requests
+
+        Args:
+            fileids: list of file IDs, or dict of {fileid: request body} to set a body per copy
+            _body: dict, Request body applied to every copy when fileids is a list, Ex: {'parents': ['0B7...']}
+
+        Needs one of WRITE_SCOPES, raises ScopeError before any request otherwise.
+
+        Returns:
+            OrderedDict of {source fileid: new file dict}, or {source fileid: HttpError} for failed requests
+
+        """
+        self._require_scope(self.WRITE_SCOPES, 'batch_copy')
+        if hasattr(fileids, 'items'):
+            copies = list(fileids.items())
+        else:
+            copies = [(fileid, _body or {}) for fileid in fileids]
+        requests = [(fileid, self.service.files().copy(fileId=fileid, body=body)) for fileid, body in copies]
+        return self._execute_batch(requests)
+
+    def copy_folder(self, folderid, name, parentid=None):
+        """Copy the files of a folder, Ex: a template folder of report spreadsheets, into a new folder
+
+        Subfolders are not copied. Costs one request to create the folder, one list request
+        per 1000 files and one batch request per 100 files. Needs one of WRITE_SCOPES, raises
+        ScopeError before the folder is created otherwise.
+
+        Args:
+            folderid: string, The ID of the folder to copy
+            name: string, Name of the new folder
+            parentid: string, The ID of the folder to create the new folder in, defaults to My Drive
+
+        Returns:
+            (new folder dict, OrderedDict of {source fileid: new file dict or HttpError})
+
+        """
+        self._require_scope(self.WRITE_SCOPES, 'copy_folder')
+        body = {'name': name, 'mimeType': 'application/vnd.google-apps.folder'}
+        if parentid is not None:
+            body['parents'] = [parentid]
+        folder = self.create(_body=body)
+        query = "'{0}' in parents and trashed = false and mimeType != 'application/vnd.google-apps.folder'".format(folderid)
+        files = self.iter_files(query, pagesize=1000, fields='id, name')
+        copies = OrderedDict((f['id'], {'name': f['name'], 'parents': [folder['id']]}) for f in files)
+        log.info('Copying {0} files from {1} to new folder {2}'.format(len(copies), folderid, name))
+        return (folder, self.batch_copy(copies))
+
+    def _execute_batch(self, requests, priority='bulk'):
+        """Sends (key, HttpRequest) pairs in batches of BATCH_LIMIT, retrying rate limited requests
+
+        A batch POST failing with a retryable error is re-queued whole, along with the rate limited
+        requests of the other batches, and retried after the scheduler's backoff.
+
+        Returns:
+            OrderedDict of {key: response}, or {key: HttpError} for requests that failed
+
+        """
+        results = OrderedDict((key, None) for key, request in requests)
+        pending = list(enumerate(requests))
+        attempt = 0
+        while pending:
+            retry = []
+            for i in range(0, len(pending), self.BATCH_LIMIT):
+                chunk = dict(pending[i:i + self.BATCH_LIMIT])
+                responses = {}
+
+                def callback(request_id, response, exception):
+                    responses[int(request_id)] = exception if exception is not None else response
+
+                batch = self.service.new_batch_http_request(callback=callback)
+                for n, (key, request) in chunk.items():
+                    batch.add(request, request_id=str(n))
+                scheduler.acquire(self.api_name, self.credential_path, priority=priority, n=len(chunk))
+                try:
+                    with http_pool.lease(self.credentials) as http:
+                        batch.execute(http=http)
+                except HttpError as e:
+                    if is_retryable(e) and attempt < scheduler.max_retries:
+                        log.warning('Batch of {0} requests returned {1}'.format(len(chunk), e.resp.status))
+                        retry.extend(chunk.items())
+                    else:
+                        log.error('Batch of {0} requests failed: {1}'.format(len(chunk), e))
+                        for n, (key, request) in chunk.items():
+                            results[key] = e
+                    continue
+                for n, (key, request) in chunk.items():
+                    response = responses.get(n)
+                    if (isinstance(response, HttpError) and is_retryable(response)
+                            and attempt < scheduler.max_retries):
+                        retry.append((n, (key, request)))
+                    results[key] = response
+            if retry:
+                backoff = scheduler.backoff(attempt)
+                log.warning('{0} batched requests rate limited or failed, retrying in {1:.1f} seconds'.format(len(retry), backoff))
+                time.sleep(backoff)
+            pending = retry
+            attempt += 1
+        log.info('Batch complete: {0} requests in {1} batches'.format(
+            len(requests), (len(requests) + self.BATCH_LIMIT - 1) // self.BATCH_LIMIT))
+        return results
+
     def get_media(self,
                   fileid,
-                  ackabuse=None):
-        """Get a file's metadata or content by ID
+                  filepath=None,
+                  chunksize=10 * 1024 * 1024,
+                  ackabuse=None,
+                  info=None):
+        """Download a file's content to disk in chunks by ID
+
+        Content is fetched with ranged requests of `chunksize` bytes and written to `filepath + '.part'`,
+        which replaces `filepath` once complete. If a download is interrupted, calling get_media again
+        resumes from the end of the partial file with a `Range` header. Reading content needs one of
+        CONTENT_SCOPES, the default drive.metadata.readonly scope raises ScopeError.
 
         Args:
             fileid: string, The ID of the file. (required)
+            filepath: string, Where to write the file, defaults to the file's name in DATADIR
+            chunksize: int, Bytes requested per ranged request, Ex: 10485760
             ackabuse: boolean, Whether the user is acknowledging the risk of downloading known malware or other abusive files. This is only applicable when alt=media.
+            info: dict, The file's metadata with at least name and size, fetched if None
 
         Returns:
-            The media object as a string.
+            Path of the downloaded file
 
         https://developers.google.com/resources/api-libraries/documentation/drive/v3/python/latest/drive_v3.files.html#get_media
 
         """
-        pass
+        self._require_scope(self.CONTENT_SCOPES, 'get_media')
+        if info is None:
+            info = self._execute(self.service.files().get(fileId=fileid, fields='name,size'))
+        if filepath is None:
+            filepath = os.path.join(DATADIR, info['name'])
+        size = int(info.get('size', -1))
+        partpath = filepath + '.part'
+        progress = os.path.getsize(partpath) if os.path.isfile(partpath) else 0
+        if progress > size >= 0:
+            progress = 0
+        if progress:
+            log.info('Resuming download of {0} at byte {1} of {2}'.format(info['name'], progress, size))
+        else:
+            log.info('Downloading {0} ({1} bytes) to {2}'.format(info['name'], size, filepath))
+        request = self.service.files().get_media(fileId=fileid, acknowledgeAbuse=ackabuse)
+        with open(partpath, 'ab' if progress else 'wb') as fd, http_pool.lease(self.credentials) as http:
+            attempt = 0
+            while progress != size:
+                headers = {'range': 'bytes={0}-{1}'.format(progress, progress + chunksize - 1)}
+                scheduler.acquire(self.api_name, self.credential_path, priority='bulk')
+                resp, content = http.request(request.uri, request.method, headers=headers)
+                if resp.status in (200, 206):
+                    if resp.status == 200:  # the whole file, the range was ignored
+                        fd.truncate(0)
+                        progress = 0
+                    fd.write(content)
+                    progress += len(content)
+                    attempt = 0
+                    log.debug('Downloaded {0} of {1} bytes'.format(progress, size))
+                    if resp.status == 200 or len(content) < chunksize:
+                        break
+                    continue
+                error = HttpError(resp, content, uri=request.uri)
+                if attempt >= scheduler.max_retries or not is_retryable(error):
+                    raise error
+                backoff = scheduler.backoff(attempt)
+                log.warning('Download of {0} returned {1}, retrying in {2:.1f} seconds'.format(
+                    info['name'], resp.status, backoff))
+                attempt += 1
+                time.sleep(backoff)
+        os.replace(partpath, filepath)
+        log.info('Download complete: {0}'.format(filepath))
+        return filepath
+
+    def get_media_many(self,
+                       fileids,
+                       directory=DATADIR,
+                       chunksize=10 * 1024 * 1024,
+                       maxworkers=4):
+        """Download the content of many files concurrently
+
+        Args:
+            fileids: list of file IDs, or dict of {fileid: filepath}
+            directory: string, Directory to write files named after their Drive name, used when fileids is a list
+            chunksize: int, Bytes requested per ranged request, Ex: 10485760
+            maxworkers: int, Number of files downloaded at once, Ex: 4
+
+        Returns:
+            dict of {fileid: filepath}, or {fileid: Exception} for failed downloads, which can be retried to resume
+
+        """
+        self._require_scope(self.CONTENT_SCOPES, 'get_media_many')
+        if hasattr(fileids, 'items'):
+            targets = list(fileids.items())
+        else:
+            targets = [(fileid, None) for fileid in fileids]
+
+        def download(fileid, filepath):
+            info = self._execute(self.service.files().get(fileId=fileid, fields='name,size'))
+            if filepath is None:
+                filepath = os.path.join(directory, info['name'])
+            return self.get_media(fileid, filepath=filepath, chunksize=chunksize, info=info)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, maxworkers)) as executor:
+            futures = {executor.submit(download, fileid, filepath): fileid for fileid, filepath in targets}
+            for future in as_completed(futures):
+                fileid = futures[future]
+                try:
+                    results[fileid] = future.result()
+                except Exception as e:
+                    log.error('Download of {0} failed: {1}'.format(fileid, e))
+                    results[fileid] = e
+        return results
 
     def update(self,
                fileid,
@@ -618,6 +1853,8 @@ class DriveApi(GoogleApi):
                ocrlang=None):
         """Updates a file's metadata and/or content with patch semantics.
 
+        Needs one of METADATA_WRITE_SCOPES, or of WRITE_SCOPES with `mediabody`, raises ScopeError otherwise.
+
         Params:
             fileid (str):    The ID of the file. (required)
             _body (object):   The request body
@@ -634,7 +1871,16 @@ class DriveApi(GoogleApi):
         https://developers.google.com/resources/api-libraries/documentation/drive/v3/python/latest/drive_v3.files.html#update
 
         """
-        pass
+        self._require_scope(self.METADATA_WRITE_SCOPES if mediabody is None else self.WRITE_SCOPES, 'update')
+        return self._execute(self.service.files().update(
+            fileId=fileid,
+            body=_body,
+            media_body=mediabody,
+            addParents=addparents,
+            removeParents=removeparents,
+            useContentAsIndexableText=usecontentasidxtxt,
+            ocrLanguage=ocrlang
+        ))
 
     def copy(self,
              fileid,
@@ -644,6 +1890,8 @@ class DriveApi(GoogleApi):
              ocrlang=None):
         """Creates a copy of a file and applies any requested updates with patch semantics.
 
+        Needs one of WRITE_SCOPES, raises ScopeError otherwise.
+
         Params:
             fileid (str):   The ID of the file. (required)
             _body (object):    The request body. (required)
@@ -658,4 +1906,11 @@ class DriveApi(GoogleApi):
         https://developers.google.com/resources/api-libraries/documentation/drive/v3/python/latest/drive_v3.files.html#copy
 
         """
-        pass
+        self._require_scope(self.WRITE_SCOPES, 'copy')
+        return self._execute(self.service.files().copy(
+            fileId=fileid,
+            body=_body,
+            keepRevisionForever=keeprevforever,
+            ignoreDefaultVisibility=ignoredefvis,
+            ocrLanguage=ocrlang
+        ))
@@ -14,3 +14,13 @@ class AssertError(ProspectingException):
         print('AssertionError: {0}'.format(self.err))
         print('No columns in headerrow. Add columns to sheet or pass headerrow=None.')
         print('Check self.data for malformed response (no columns set).')
+
+
+class CassetteError(ProspectingException):
+    """Raised when a replayed request has no recorded response"""
+    pass
+
+
+class ScopeError(ProspectingException):
+    """Raised before a request that the authorized scopes do not allow"""
+    pass
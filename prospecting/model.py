@@ -5,13 +5,16 @@ import time
 
 #import numpy as np
 import pandas as pd
+from scipy import sparse
 from prospecting import (utils, report)
+from prospecting.process import SparseDataset
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler  # normal distribution
 from sklearn.preprocessing import MinMaxScaler  # scales data to [0, 1]
-#from sklearn.preprocessing import MaxAbsScaler  # scales data to [-1, 1]; for data already centered at zero, or sparse data
+from sklearn.preprocessing import MaxAbsScaler  # scales data to [-1, 1]; for data already centered at zero, or sparse data
 from sklearn.decomposition import PCA
+from sklearn.decomposition import TruncatedSVD  # PCA without centering, for sparse data
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import GridSearchCV
 
@@ -23,35 +26,53 @@ log = logging.getLogger('prospecting.model')
 
 class ModelSession:
 
-    def __init__(self, dataset, testsize=0.3, randstate=0, stdscaler=True, mmscaler=True, pcasets=True):
+    def __init__(self, dataset, testsize=0.3, randstate=0, stdscaler=True, mmscaler=True, pcasets=True,
+                 svdcomponents=100):
         """Initialize ModelSession class
 
+        A pickled DataFrame has the target in its first column. A pickled SparseDataset (see
+        process.encode_sparse) stays sparse throughout: the splits are CSR matrices, StandardScaler
+        only scales, MaxAbsScaler replaces MinMaxScaler (X_train_mas) and TruncatedSVD replaces PCA.
+
         Args:
             dataset (list):  List of strings representing which X training set to use (named train set must exist as part of an initialized ModelSession class), ex: ['X_train', 'X_train_std']
             testsize (float): Percentage of dataset to use for value of test_size in train_test_split
             randstate (int):   Random state to use
             stdscaler (bool):   Flag to control if StandardScaler() training set should be fit
-            mmscaler (bool):   Flag to control if MinMaxScaler() training set should be fit
-            pcasets (bool):   Flag to control if PCA() sets should be created
+            mmscaler (bool):   Flag to control if MinMaxScaler() (MaxAbsScaler() if sparse) training set should be fit
+            pcasets (bool):   Flag to control if PCA() (TruncatedSVD() if sparse) sets should be created
+            svdcomponents (int):   Number of TruncatedSVD() components for sparse datasets
 
         """
         self.session_id = generate_session_id()
         self.dataset_name = os.path.splitext(os.path.basename(dataset))[0]
         self.dataset = utils.unpckl(os.path.basename(dataset))
-        self.X = self.dataset.iloc[:, 1:].values
-        self.y = self.dataset.iloc[:, 0].values
+        if isinstance(self.dataset, SparseDataset):
+            self.X = self.dataset.matrix
+            self.y = self.dataset.target
+        else:
+            self.X = self.dataset.iloc[:, 1:].values
+            self.y = self.dataset.iloc[:, 0].values
+        self.sparse = sparse.issparse(self.X)
         self.test_size = testsize
         self.rand_state = randstate
         self.stdscaler = stdscaler
         self.mmscaler = mmscaler
         self.pcasets = pcasets
+        self.svd_components = svdcomponents
         self.splits()
         if self.stdscaler is True:
             self.std_scaler()
         if self.mmscaler is True:
-            self.minmax_scaler()
+            if self.sparse is True:
+                self.maxabs_scaler()
+            else:
+                self.minmax_scaler()
         if self.pcasets is True:
-            self.pca_sets()
+            if self.sparse is True:
+                self.svd_sets()
+            else:
+                self.pca_sets()
 
     def splits(self):
         self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(self.X,
@@ -60,6 +81,12 @@ class ModelSession:
                                                                                 random_state=self.rand_state)
 
     def std_scaler(self):
+        if self.sparse is True:
+            # centering would make every zero nonzero
+            stdsc = StandardScaler(with_mean=False)
+            self.X_train_std = stdsc.fit_transform(self.X_train)
+            self.X_test_std = stdsc.transform(self.X_test)
+            return
         stdsc = StandardScaler()
         self.X_train_std = stdsc.fit_transform(self.X_train)
         self.X_test_std = stdsc.fit(self.X_test)
@@ -69,6 +96,26 @@ class ModelSession:
         self.X_train_mms = mms.fit_transform(self.X_train)
         self.X_test_mms = mms.fit(self.X_test)
 
+    def maxabs_scaler(self):
+        mas = MaxAbsScaler()
+        self.X_train_mas = mas.fit_transform(self.X_train)
+        self.X_test_mas = mas.transform(self.X_test)
+
+    def svd_sets(self):
+        # kept as pca* attributes, TruncatedSVD has the explained_variance_ attributes plotted by report
+        n_components = max(1, min(self.svd_components, self.X_train.shape[1] - 1))
+        self.pca = TruncatedSVD(n_components=n_components, random_state=self.rand_state)
+        self.pca.train_set = 'X_train'
+        self.X_pca = self.pca.fit_transform(self.X_train)
+        if self.stdscaler is True:
+            self.pca_std = TruncatedSVD(n_components=n_components, random_state=self.rand_state)
+            self.pca_std.train_set = 'X_train_std'
+            self.X_pca_std = self.pca_std.fit_transform(self.X_train_std)
+        if self.mmscaler is True:
+            self.pca_mas = TruncatedSVD(n_components=n_components, random_state=self.rand_state)
+            self.pca_mas.train_set = 'X_train_mas'
+            self.X_pca_mas = self.pca_mas.fit_transform(self.X_train_mas)
+
     def pca_sets(self):
         self.pca = PCA()
         self.pca.train_set = 'X_train'
@@ -93,6 +140,12 @@ def generate_session_id():
 
 
 def grid_search(modelsession, modelconfig):
+    # reports are batched; the age limit (maxdelay) keeps flushing them during a long search, so a crash loses few rows
+    with modelsession.ss.write_buffer():
+        _grid_search(modelsession, modelconfig)
+
+
+def _grid_search(modelsession, modelconfig):
     for config in modelconfig:
         for ds in config['datasets']:
             if hasattr(modelsession, ds):
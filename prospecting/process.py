@@ -1,38 +1,975 @@
 
 
+import os
+import re
+import json
+import pickle
+import time
+import hashlib
+import tracemalloc
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import logging
 log = logging.getLogger('prospecting.process')
+import numpy as np
 import pandas as pd
+from pandas.api.types import infer_dtype
+try:
+    from pandas.util import hash_pandas_object
+except ImportError:
+    try:
+        from pandas.tools.hashing import hash_pandas_object  # pandas 0.19.2
+    except ImportError:
+        hash_pandas_object = None
+from scipy import sparse
+from prospecting import utils
+from prospecting.env import TMPDIR
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:  # Python < 3.8, columns are pickled to workers instead
+    shared_memory = None
 
+UNIX_EPOCH_ORDINAL = 719163  # datetime.date(1970, 1, 1).toordinal()
+FILL_VALUES = {'TRUE': True, 'FALSE': False, '0': 0}  # metadata 'fill_na_with' values
 
-def clean_data(dataframe, metadata):
+
+def clean_data(dataframe, metadata, plan=None, maxworkers=1, cache=None, profiler=None):
+    """Cleans `dataframe` with the column treatments configured in the metadata sheet
+
+    Args:
+        dataframe (DataFrame):  Raw data
+        metadata (DataFrame):   Metadata sheet, one row per column of the raw data
+        plan (CleaningPlan):    Precompiled plan, compiled from `metadata` (and cached) if None
+        maxworkers (int):   Worker processes to split the columns across, 1 cleans in this process
+        cache (ColumnCache):    Reuse cleaned columns whose input and treatment are unchanged
+        profiler (CleaningProfiler):    Record time, memory, rows and columns of each step and column
+
+    Returns:
+        Cleaned copy of `dataframe`
+
+    Ex:
+        cache = ColumnCache()
+        df_clean = clean_data(df_raw, md, cache=cache)
+        md = ss.get('metadata', headerrow=1)  # after editing one column's treatment
+        df_clean = clean_data(df_raw, md, cache=cache)  # only that column is cleaned again
+
+    """
     log.info("Cleaning data...")
-    tmp_df = dataframe.copy()
-    tmp_df = drop_rows_with_na(tmp_df,metadata, copy=False)
-    tmp_df = derive_to_bool(tmp_df,metadata, copy=False)
-    tmp_df = drop_columns(tmp_df,metadata, copy=False)
-    tmp_df = strip(tmp_df, metadata, copy=False)
-    tmp_df = date_to_ordinal(tmp_df,metadata, copy=False)
-    tmp_df = float_to_object(tmp_df,metadata, copy=False)
-    tmp_df = int_to_object(tmp_df,metadata, copy=False)
-    tmp_df = zfill_col(tmp_df, metadata, copy=False)
-    tmp_df = fill_na_with(tmp_df, metadata, copy=False)
-    tmp_df = replace(tmp_df, metadata, copy=False)
-    tmp_df = str_to_int(tmp_df, metadata, copy=False)
-    tmp_df = object_to_int(tmp_df, metadata, copy=False)
-    tmp_df = object_to_float(tmp_df, metadata, copy=False)
-    tmp_df = float_to_int(tmp_df, metadata, copy=False)
+    with _profiled(profiler, 'clean_data', rowsin=dataframe.shape[0], columns=dataframe.shape[1]) as record:
+        if plan is None:
+            with _profiled(profiler, 'compile_plan', columns=metadata.shape[0]):
+                plan = compile_plan(metadata)
+        tmp_df = plan.execute(dataframe, maxworkers=maxworkers, cache=cache, profiler=profiler)
+        record['rows_out'] = tmp_df.shape[0]
     tmp_df.__name__ = 'df_clean'
     log.info("Data cleaned...")
     return tmp_df
 
 
+def clean_csv(path, metadata, outdir, chunksize=100000, plan=None, overwrite=False, **read_csv_kwargs):
+    """Cleans a CSV file chunk by chunk into a partitioned Parquet dataset
+
+    Only one chunk of raw and cleaned rows is in memory at a time, so files larger than memory
+    can be cleaned. Each chunk goes through the same compiled plan as `clean_data`; the Parquet
+    schema is taken from the first cleaned chunk and later chunks are cast to it.
+
+    Args:
+        path (str): CSV file path or URL, compressed files (.gz, .bz2, .zip, .xz) are inferred
+        metadata (DataFrame):   Metadata sheet, one row per column of the raw data
+        outdir (str):   Directory of the Parquet dataset, one part file per chunk
+        chunksize (int):    Rows read per chunk
+        plan (CleaningPlan):    Precompiled plan, compiled from `metadata` (and cached) if None
+        overwrite (bool):   Remove existing part files in `outdir` instead of raising
+        **read_csv_kwargs:  Passed to `pd.read_csv` (ex. index_col, thousands, dtype, parse_dates)
+
+    Returns:
+        dict with the part files written and the rows read and written
+
+    Ex:
+        summary = clean_csv(SOURCE_CSV, md, os.path.join(DATADIR, 'clean'),
+                            index_col='record_ID', decimal='.', thousands=",")
+        df_clean = utils.read_parquet_dir(os.path.join(DATADIR, 'clean'))
+
+    Note:
+        read_csv infers dtypes per chunk, so a column can read as int in one chunk and float or
+        object in another. Pass `dtype=` for such columns if a chunk fails to cast to the schema.
+
+    """
+    if os.path.isdir(outdir):
+        parts = [f for f in os.listdir(outdir) if f.endswith('.parquet')]
+        if parts and not overwrite:
+            raise FileExistsError('{0} already has {1} part files, pass overwrite=True to replace them'.format(outdir, len(parts)))
+        for part in parts:
+            os.remove(os.path.join(outdir, part))
+    if plan is None:
+        plan = compile_plan(metadata)
+    summary = {'parts': [], 'rows_read': 0, 'rows_written': 0}
+    schema = None
+    for i, chunk in enumerate(pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs)):
+        summary['rows_read'] += chunk.shape[0]
+        cleaned = plan.execute(chunk)
+        del chunk
+        if cleaned.shape[0] == 0:
+            continue
+        if any(name is not None for name in cleaned.index.names):
+            cleaned = cleaned.reset_index()
+        if schema is None:
+            schema = utils.parquet_schema(cleaned)
+        try:
+            summary['parts'].append(utils.write_parquet_part(cleaned, outdir, schema=schema))
+        except (ValueError, TypeError):  # pyarrow's ArrowInvalid and ArrowTypeError
+            log.error("Chunk {0} does not match the schema of the first chunk, pass dtype= for its columns".format(i))
+            raise
+        summary['rows_written'] += cleaned.shape[0]
+        log.info("Cleaned chunk {0}: {1} rows read, {2} rows written".format(i, summary['rows_read'], summary['rows_written']))
+    return summary
+
+
+def compact_dtypes(dataframe, metadata=None, maxcategories=255, copy=True):
+    """Converts columns to the smallest dtypes that hold their values exactly
+
+    - string columns with at most `maxcategories` distinct values become `category`
+    - integer columns are downcast to the smallest integer width that fits
+    - float64 columns become float32 when every value converts back unchanged
+    - object columns of True/False (ex. `_bool` or fill_na columns) become a category of the values
+      present, so `pd.get_dummies` still encodes them into the same `<column>_False`/`<column>_True` columns
+
+    Optional metadata sheet columns control each column (a derived `<column>_bool` column follows
+    the row of `<column>`): `compact` "0" leaves the column as is, `max_categories` overrides
+    `maxcategories`. Metadata without these columns, or blank values, use the defaults.
+
+    Args:
+        dataframe (DataFrame):  Cleaned data, ex. the output of clean_data
+        metadata (DataFrame):   Metadata sheet, optional
+        maxcategories (int):    Most distinct values for a string column to become a category
+        copy (bool):    Convert a copy of `dataframe`
+
+    Returns:
+        (compacted DataFrame, report DataFrame with one row per column: dtype and bytes before and after)
+
+    Ex:
+        df_clean, compact_report = compact_dtypes(clean_data(df_raw, md), md)
+        compact_report['bytes_after'].sum() / compact_report['bytes_before'].sum()
+
+    """
+    if copy is True:
+        dataframe = dataframe.copy()
+    settings = {}
+    if metadata is not None:
+        for setting in ('compact', 'max_categories'):
+            if setting in metadata.columns:
+                settings[setting] = dict(zip(metadata['column_name'], metadata[setting]))
+    report = []
+    for col in dataframe.columns:
+        derived = isinstance(col, str) and col.endswith('_bool') and col not in settings.get('compact', {})
+        name = col[:-len('_bool')] if derived else col
+        series = dataframe[col]
+        bytes_before = series.memory_usage(index=False, deep=True)
+        compacted = series
+        if str(settings.get('compact', {}).get(name, '1')) != '0':
+            limit = settings.get('max_categories', {}).get(name)
+            limit = maxcategories if limit is None or str(limit).strip() in ('', 'nan') else int(limit)
+            compacted = _compact_column(series, limit)
+            if compacted.memory_usage(index=False, deep=True) >= bytes_before:
+                compacted = series
+            else:
+                dataframe[col] = compacted
+        report.append((col, str(series.dtype), str(compacted.dtype),
+                       bytes_before, compacted.memory_usage(index=False, deep=True)))
+    report = pd.DataFrame.from_records(report, columns=['column_name', 'dtype_before', 'dtype_after',
+                                                       'bytes_before', 'bytes_after'])
+    log.info("Compacted dtypes from {0} to {1} bytes".format(report['bytes_before'].sum(), report['bytes_after'].sum()))
+    return (dataframe, report)
+
+
+def _compact_column(series, maxcategories):
+    """Returns `series` in its smallest exact dtype, or `series` itself when none applies"""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iu':
+        return pd.to_numeric(series, downcast='integer' if dtype.kind == 'i' else 'unsigned')
+    if dtype == np.float64:
+        values = series.values.astype(np.float32)
+        same = (values.astype(np.float64) == series.values) | (np.isnan(values) & np.isnan(series.values))
+        return series.astype(np.float32) if same.all() else series
+    if dtype == object or getattr(dtype, 'name', None) in ('string', 'str'):
+        notnull = series.dropna()
+        kind = infer_dtype(notnull.values) if notnull.shape[0] else 'empty'
+        if kind == 'boolean':
+            categorical = pd.Categorical(series.values, categories=sorted(notnull.unique()))
+            return pd.Series(categorical, index=series.index, name=series.name)
+        if kind == 'string' and notnull.nunique() <= maxcategories:
+            return series.astype('category')
+    return series
+
+
+class SparseDataset:
+    """One-hot encoded features as a CSR matrix with their column names, from encode_sparse
+
+    Attributes:
+        matrix (scipy.sparse.csr_matrix):   Features, one row per record
+        columns (list): Name of each matrix column, `<column>_<value>` for encoded values
+        target (ndarray):   Values of the target column, None if no target was given
+        targetname (str):   Name of the target column
+        shape (tuple):  Shape of `matrix`
+
+    """
+
+    def __init__(self, matrix, columns, target=None, targetname=None):
+        self.matrix = matrix
+        self.columns = list(columns)
+        self.target = target
+        self.targetname = targetname
+        self.shape = matrix.shape
+
+
+def encode_sparse(dataframe, target=None, columns=None, prefixsep='_'):
+    """One-hot encodes `dataframe` into a SparseDataset, the sparse counterpart of `pd.get_dummies`
+
+    Numeric and bool columns are kept as one column each; object, string and category columns get
+    one column per value, named and ordered as `pd.get_dummies(dataframe)` would (numeric columns
+    first, then each encoded column's values in sorted or category order). Missing values get no
+    column. Only the nonzero entries are stored.
+
+    Args:
+        dataframe (DataFrame):  Cleaned data, ex. the output of clean_data or compact_dtypes
+        target (str):   Column kept out of the matrix as `SparseDataset.target`, ex. the label
+        columns (list): Column names of a previous encoding, to encode new data in the same layout;
+                        values not in `columns` are dropped, `columns` not in the data are all zero
+        prefixsep (str):    Separator between column name and value in encoded column names
+
+    Returns:
+        SparseDataset
+
+    Ex:
+        ds = encode_sparse(df_clean, target='is_exciting')
+        utils.pckl(ds, 'innocentive_sparse')
+        ds_new = encode_sparse(df_new, target='is_exciting', columns=ds.columns)
+
+    """
+    features = dataframe.drop(target, axis=1) if target is not None else dataframe
+    numeric, encoded = [], []
+    for col in features.columns:
+        dtype = features[col].dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+            numeric.append(col)
+        elif dtype == object or getattr(dtype, 'name', None) in ('category', 'string', 'str'):
+            encoded.append(col)
+        else:
+            raise TypeError('Column {0} has dtype {1}, which cannot be encoded'.format(col, dtype))
+    categoricals = OrderedDict((col, pd.Categorical(features[col])) for col in encoded)
+    if columns is None:
+        columns = numeric + ['{0}{1}{2}'.format(col, prefixsep, value)
+                             for col, categorical in categoricals.items() for value in categorical.categories]
+    positions = {name: i for i, name in enumerate(columns)}
+    rows, cols, data = [], [], []
+    for col in numeric:
+        if col not in positions:
+            continue
+        values = features[col].values.astype(np.float64)
+        nonzero = np.flatnonzero(values != 0)  # NaN is kept, as in the dense frame
+        rows.append(nonzero)
+        cols.append(np.full(nonzero.shape[0], positions[col], dtype=np.int64))
+        data.append(values[nonzero])
+    for col, categorical in categoricals.items():
+        lookup = np.array([positions.get('{0}{1}{2}'.format(col, prefixsep, value), -1)
+                           for value in categorical.categories] + [-1], dtype=np.int64)
+        position = lookup[np.asarray(categorical.codes, dtype=np.int64)]  # missing (-1) looks up the trailing -1
+        present = np.flatnonzero(position >= 0)
+        rows.append(present)
+        cols.append(position[present])
+        data.append(np.ones(present.shape[0]))
+    concat = lambda arrays, dtype: np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+    matrix = sparse.csr_matrix((concat(data, np.float64), (concat(rows, np.int64), concat(cols, np.int64))),
+                               shape=(dataframe.shape[0], len(columns)))
+    log.info("Encoded {0} columns into a {1} sparse matrix with {2} nonzero values".format(
+        dataframe.shape[1], matrix.shape, matrix.nnz))
+    return SparseDataset(matrix, columns,
+                         target=dataframe[target].values if target is not None else None,
+                         targetname=target)
+
+
+class CleaningProfiler:
+    """Opt-in profile of clean_data, one record per cleaning step and per column operation
+
+    Each record has the wall time, the CPU time (time.process_time, this process only), the peak
+    memory allocated above the step's starting point (tracemalloc), the rows in and out and the
+    number of columns touched. Records of nested steps (ex. 'clean_data' around everything) include
+    their inner steps. Tracing memory slows allocations down, pass tracememory=False to skip it.
+
+    Ex:
+        profiler = CleaningProfiler()
+        df_clean = clean_data(df_raw, md, profiler=profiler)
+        profiler.to_dataframe().sort_values('wall_s', ascending=False).head(10)
+        profiler.to_sheet(ss)  # 'clean_profile' tab, one block of rows per run
+
+    """
+
+    COLUMNS = ['run', 'step', 'column', 'wall_s', 'cpu_s', 'peak_bytes', 'rows_in', 'rows_out', 'columns']
+
+    def __init__(self, tracememory=True):
+        self.trace_memory = tracememory
+        self.run = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.records = []
+        self._frames = []
+        self._started_tracing = False
+
+    @contextmanager
+    def step(self, step, column=None, rowsin=None, columns=None):
+        """Records the block as one step, set the yielded record's 'rows_out' inside the block"""
+        record = OrderedDict([('run', self.run), ('step', step), ('column', column), ('wall_s', None),
+                              ('cpu_s', None), ('peak_bytes', None), ('rows_in', rowsin), ('rows_out', None),
+                              ('columns', columns)])
+        self.records.append(record)
+        if self.trace_memory and not self._frames and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        frame = {'start': self._checkpoint(), 'peak': 0}
+        self._frames.append(frame)
+        wall, cpu = time.time(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.time() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            self._checkpoint()
+            self._frames.pop()
+            if tracemalloc.is_tracing():
+                record['peak_bytes'] = frame['peak']
+            if self._started_tracing and not self._frames:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def _checkpoint(self):
+        """Folds the peak since the last checkpoint into the open steps, returns the current memory"""
+        if not tracemalloc.is_tracing():
+            return 0
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._frames:
+            frame['peak'] = max(frame['peak'], peak - frame['start'])
+        if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+            tracemalloc.reset_peak()
+            return current
+        # older Pythons can only reset the peak by forgetting the traced blocks, so memory is counted
+        # from here on; blocks allocated earlier and freed later are not subtracted
+        tracemalloc.clear_traces()
+        for frame in self._frames:
+            frame['start'] -= current
+        return 0
+
+    def to_dataframe(self):
+        """Returns the records as a DataFrame, in the order the steps started"""
+        return pd.DataFrame.from_records(self.records, columns=self.COLUMNS)
+
+    def to_csv(self, path, append=True):
+        """Writes the records to a CSV file, appended after earlier runs by default"""
+        exists = os.path.isfile(path)
+        self.to_dataframe().to_csv(path, mode='a' if append else 'w', header=not (append and exists), index=False)
+        log.info("Wrote cleaning profile to {0}".format(path))
+
+    def to_sheet(self, ss, sheetname='clean_profile', append=True):
+        """Writes the records to a sheet of SheetsApi `ss`, appended after earlier runs by default
+
+        The sheet must exist; with `append` it must already have the header row (ex. from a first
+        run with append=False).
+
+        """
+        profile = self.to_dataframe().astype(object)
+        profile = profile.where(profile.notnull(), '')
+        if append:
+            ss.append(profile, sheetname)
+        else:
+            ss.clear(sheetname)
+            ss.update(profile, sheetname)
+
+
+@contextmanager
+def _profiled(profiler, step, column=None, rowsin=None, columns=None):
+    """profiler.step(...), or a throwaway record when there is no profiler"""
+    if profiler is None:
+        yield {}
+        return
+    with profiler.step(step, column=column, rowsin=rowsin, columns=columns) as record:
+        yield record
+
+
+class ColumnCache:
+    """On-disk cache of cleaned columns, keyed by their input values and cleaning operations
+
+    A column's key hashes its name, dtype and values, its compiled operations (the treatment from
+    its metadata row) and the rows kept by the row filter, so editing one column's treatment only
+    changes that column's key. Changing a drop_rows_with_na column changes the rows, and so every
+    key. The least recently used columns are evicted once more than `maxbytes` are stored.
+
+    Ex:
+        cache = ColumnCache()
+        df_clean = clean_data(df_raw, md, cache=cache)
+
+    """
+
+    FORMAT = 1  # bump when cleaned values change for unchanged operations
+
+    def __init__(self, cachedir=None, maxbytes=2 * 1024 ** 3):
+        """Initialize ColumnCache class
+
+        Args:
+            cachedir (str): Directory to store columns in, defaults to TMPDIR/clean_cache
+            maxbytes (int): Maximum size of the stored columns, Ex: 2 * 1024 ** 3
+
+        """
+        self.cache_dir = cachedir or os.path.join(TMPDIR, 'clean_cache')
+        self.index = utils.LruIndex(self.cache_dir, maxbytes=maxbytes)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_rows(keep):
+        """Returns the hash of a row filter, as returned by CleaningPlan.row_filter"""
+        return 'all' if keep is None else hashlib.sha1(np.ascontiguousarray(keep).tobytes()).hexdigest()
+
+    def make_key(self, series, ops, keephash):
+        """Returns the key of an input column cleaned by `ops` on the rows of `keephash`"""
+        key = hashlib.sha1()
+        key.update(json.dumps([self.FORMAT, pd.__version__, str(series.name), str(series.dtype), series.shape[0],
+                               [_op_key(op, arg) for op, arg in ops], keephash]).encode('utf-8'))
+        values = series.values
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'biufcmM':
+            key.update(np.ascontiguousarray(values).tobytes())
+        else:
+            _hash_contents(key, series)
+        return key.hexdigest()
+
+    def contains(self, key):
+        return key in self.index
+
+    def get(self, key):
+        """Returns the cleaned column stored under `key` (with a default index), or None"""
+        entry = self.index.get(key)
+        if entry is None or not os.path.isfile(self.index.path(key)):
+            self.misses += 1
+            return None
+        with open(self.index.path(key), 'rb') as f:
+            series = pickle.load(f)
+        self.hits += 1
+        return series
+
+    def put(self, key, series):
+        """Stores a cleaned column under `key`, its index is not stored"""
+        filename = key + '.p'
+        path = os.path.join(self.cache_dir, filename)
+        with open(path, 'wb') as f:
+            pickle.dump(series.reset_index(drop=True), f, pickle.HIGHEST_PROTOCOL)
+        self.index.put(key, {'column': str(series.name), 'file': filename, 'bytes': os.path.getsize(path)})
+
+    def clear(self):
+        """Removes every stored column"""
+        self.index.remove(*[key for key, entry in self.index.items()])
+        self.flush()
+
+    def flush(self):
+        """Writes the index of stored columns if it changed, CleaningPlan.execute calls it once per run"""
+        self.index.flush()
+
+
+def _hash_contents(key, series):
+    """Updates `key` with the values of a non-numeric column, by content rather than object identity
+
+    Equal columns read separately hold distinct but equal objects, which pickle differently, so values
+    are hashed with hash_pandas_object (their repr on pandas without it). The type of each value is
+    hashed alongside, as 1 and '1' hash alike.
+    """
+    values = np.asarray(series.values, dtype=object)
+    if hash_pandas_object is not None:
+        key.update(np.ascontiguousarray(hash_pandas_object(series, index=False).values).tobytes())
+    else:
+        key.update('\x1f'.join(map(repr, values)).encode('utf-8'))
+    codes, types = pd.factorize(np.frompyfunc(type, 1, 1)(values))
+    key.update(np.ascontiguousarray(codes, dtype=np.int64).tobytes())
+    key.update(json.dumps(['{0}.{1}'.format(t.__module__, t.__name__) for t in types]).encode('utf-8'))
+
+
+def _op_key(op, arg):
+    """Returns a stable, JSON serializable description of a compiled operation"""
+    if isinstance(arg, RegexGroup):
+        return [op, arg.regex, arg.regex_replace, _sequential_replace()]
+    if isinstance(arg, type):
+        return [op, arg.__name__]
+    return [op, repr(arg)]
+
+
+class CleaningPlan:
+    """The cleaning steps of the metadata sheet, compiled once into per-column operations
+
+    Compiling reads the metadata once: the row filters, the column lists and the per-column
+    arguments (chars to strip, zfill width, fill value, regex lists) are resolved up front, so
+    executing the plan on many datasets or chunks does no metadata lookups.
+
+    Attributes:
+        metadata_hash (str):    Hash of the metadata the plan was compiled from
+        dropna_cols (list): Columns whose missing values drop the row
+        bool_cols (list):   Columns replaced by a `<column>_bool` not-null flag
+        drop_cols (list):   Columns dropped (keep_flag 0)
+        column_ops (OrderedDict):   {column_name: [(op, arg), ...]} with ops in clean_data step order
+
+    """
+
+    def __init__(self, metadata):
+        self.metadata_hash = metadata_hash(metadata)
+        self.dropna_cols = _flagged(metadata, 'drop_rows_with_na')
+        self.bool_cols = _flagged(metadata, 'derive_to_bool')
+        self.drop_cols = _flagged(metadata, 'keep_flag', "0")
+        self.column_ops = OrderedDict()
+        rows = metadata.set_index('column_name')
+        for col in _flagged(metadata, 'strip_chars'):
+            self._add(col, 'strip', rows.loc[col, 'chars_to_strip'])
+        for col in _flagged(metadata, 'date_to_ordinal'):
+            self._add(col, 'date_to_ordinal', None)
+        for col in _flagged(metadata, 'float_to_object'):
+            self._add(col, 'astype', object)
+        for col in _flagged(metadata, 'int_to_object'):
+            self._add(col, 'astype', object)
+        for col in _flagged(metadata, 'zfill_col'):
+            self._add(col, 'zfill', int(rows.loc[col, 'z']))
+        for col in _flagged(metadata, 'fill_na'):
+            self._add(col, 'fillna', fill_value(col, rows.loc[col, 'fill_na_with']))
+        for group in [i for i in set(metadata['regex_group']) if i != '0']:
+            group_rows = metadata[metadata['regex_group'].isin([group])]
+            regex = [r for i in set(group_rows['regex']) for r in i.split(" | ")]
+            regex_replace = [rr for i in set(group_rows['regex_replace']) for rr in i.split(" | ")]
+            for col in group_rows['column_name'].tolist():
+                self._add(col, 'replace', regex_group(regex, regex_replace))
+        for col in _flagged(metadata, 'str_to_int'):
+            self._add(col, 'astype', int)
+        for col in _flagged(metadata, 'object_to_int'):
+            self._add(col, 'astype', int)
+        for col in _flagged(metadata, 'object_to_float'):
+            self._add(col, 'astype', float)
+        for col in _flagged(metadata, 'float_to_int'):
+            self._add(col, 'astype', int)
+        log.info("Compiled cleaning plan {0}: {1} columns with operations".format(
+            self.metadata_hash[:8], len(self.column_ops)))
+
+    def _add(self, col, op, arg):
+        self.column_ops.setdefault(col, []).append((op, arg))
+
+    def execute(self, dataframe, maxworkers=1, cache=None, profiler=None):
+        """Returns a cleaned copy of `dataframe`
+
+        Runs as a fused, column-at-a-time engine: the row filter is computed once, then each column
+        is taken from `dataframe`, filtered, and passed through its whole chain of operations as a
+        Series, without the intermediate whole-frame copy or column reassignments of the step
+        functions. The output frame is assembled once at the end, in the same column order and with
+        the same values and dtypes as running the step functions in clean_data order.
+
+        With `maxworkers` > 1 the columns with operations are split across a process pool, see
+        `run_parallel`; the row filter, derived bool columns and output assembly stay in this process.
+
+        With a `cache` (ColumnCache), columns with operations are first looked up by a hash of their
+        input values, operations and the row filter; only the columns not found are cleaned, and are
+        then stored in the cache.
+
+        With a `profiler` (CleaningProfiler), each of these stages and each column's operation is
+        recorded; columns cleaned in the process pool are recorded as one 'process_pool' step.
+
+        """
+        try:
+            return self._execute(dataframe, maxworkers, cache, profiler)
+        finally:
+            if cache is not None:
+                cache.flush()
+
+    def _execute(self, dataframe, maxworkers, cache, profiler):
+        with _profiled(profiler, 'row_filter', rowsin=dataframe.shape[0], columns=len(self.dropna_cols)) as record:
+            keep = self.row_filter(dataframe)
+            index = dataframe.index if keep is None else dataframe.index[keep]
+            record['rows_out'] = index.shape[0]
+        columns = self.output_columns(dataframe)
+        keys = {}
+        cleaned = {}
+        if cache is not None:
+            with _profiled(profiler, 'cache_lookup', rowsin=dataframe.shape[0]) as record:
+                keephash = cache.hash_rows(keep)
+                for col in columns:
+                    if col in self.column_ops and col not in self.bool_cols:
+                        keys[col] = cache.make_key(dataframe[col], self.column_ops[col], keephash)
+                        series = cache.get(keys[col])
+                        if series is not None:
+                            series.index = index
+                            cleaned[col] = series
+                record['columns'] = len(keys)
+            log.info("{0} of {1} cleaned columns served from cache".format(len(cleaned), len(keys)))
+        if maxworkers > 1:
+            tasks = [(col, self.input_column(dataframe, col, keep), self.column_ops[col])
+                     for col in columns if col in self.column_ops and col not in self.bool_cols and col not in cleaned]
+            with _profiled(profiler, 'process_pool', rowsin=index.shape[0], columns=len(tasks)) as record:
+                cleaned.update(run_parallel(tasks, index, maxworkers))
+                record['rows_out'] = index.shape[0]
+        replaced = self.replace_groups(dataframe, [col for col in columns if col not in cleaned], keep, profiler)
+        output = OrderedDict()
+        for col in columns:
+            if col in self.bool_cols:
+                with _profiled(profiler, 'derive_to_bool', column=col, rowsin=index.shape[0], columns=1) as record:
+                    output[col + '_bool'] = self.input_column(dataframe, col, keep).notnull()
+                    record['rows_out'] = index.shape[0]
+                continue
+            if col in cleaned:
+                output[col] = cleaned.pop(col)
+            elif col in replaced:
+                series, start = replaced.pop(col)
+                output[col] = run_ops(series, self.column_ops[col][start:], profiler)
+            else:
+                output[col] = run_ops(self.input_column(dataframe, col, keep), self.column_ops.get(col, []), profiler)
+            if col in keys and not cache.contains(keys[col]):
+                cache.put(keys[col], output[col])
+        with _profiled(profiler, 'assemble', rowsin=index.shape[0], columns=len(output)) as record:
+            cleaned_df = pd.DataFrame(output, index=index, columns=list(output.keys()))
+            record['rows_out'] = cleaned_df.shape[0]
+        return cleaned_df
+
+    def replace_groups(self, dataframe, columns, keep, profiler=None):
+        """Runs each regex group's columns up to and including their replace op, one pass per group
+
+        Returns:
+            {column_name: (replaced Series, index of the column's next op)}
+
+        """
+        groups = OrderedDict()
+        for col in columns:
+            if col in self.bool_cols:
+                continue
+            for i, (op, arg) in enumerate(self.column_ops.get(col, [])):
+                if op == 'replace':
+                    groups.setdefault(arg, []).append((col, i))
+        replaced = {}
+        for group, cols in groups.items():
+            series = [run_ops(self.input_column(dataframe, col, keep), self.column_ops[col][:i], profiler)
+                      for col, i in cols]
+            rows = sum(column.shape[0] for column in series)
+            with _profiled(profiler, 'replace', column=', '.join(str(col) for col, i in cols),
+                           rowsin=rows, columns=len(cols)) as record:
+                results = group.replace(series)
+                record['rows_out'] = rows
+            for (col, i), result in zip(cols, results):
+                replaced[col] = (result, i + 1)
+        return replaced
+
+    def row_filter(self, dataframe):
+        """Returns a boolean array of rows to keep, or None when no rows are dropped"""
+        if not self.dropna_cols:
+            return None
+        return dataframe[self.dropna_cols].notnull().all(axis=1).values
+
+    def output_columns(self, dataframe):
+        """Returns the input columns to process in output order, derived bool columns last
+
+        Raises KeyError, as the step functions do, when a dropped, derived or treated column is not in
+        `dataframe`, or when a treatment names a column that is dropped or replaced by its bool flag.
+
+        """
+        missing = [col for col in self.drop_cols + self.bool_cols
+                   if col not in dataframe.columns or (col in self.bool_cols and col in self.drop_cols)]
+        missing += [col for col in self.column_ops
+                    if col not in dataframe.columns or col in self.drop_cols or col in self.bool_cols]
+        if missing:
+            raise KeyError('{0} not found in axis'.format(missing))
+        return ([col for col in dataframe.columns if col not in self.drop_cols and col not in self.bool_cols] +
+                self.bool_cols)
+
+    @staticmethod
+    def input_column(dataframe, col, keep):
+        series = dataframe[col]
+        return series if keep is None else series[keep]
+
+
+def run_ops(series, ops, profiler=None):
+    """Runs a column's chain of compiled operations"""
+    for op, arg in ops:
+        if profiler is None:
+            series = apply_op(series, op, arg)
+            continue
+        with profiler.step(_op_name(op, arg), column=series.name, rowsin=series.shape[0], columns=1) as record:
+            series = apply_op(series, op, arg)
+            record['rows_out'] = series.shape[0]
+    return series
+
+
+def _op_name(op, arg):
+    return '{0}({1})'.format(op, arg.__name__) if isinstance(arg, type) else op
+
+
+def run_parallel(tasks, index, maxworkers):
+    """Runs each column's operations in a pool of `maxworkers` processes
+
+    The columns are split into `maxworkers` partitions of about equal cost, one task per worker.
+    Columns with a fixed-width NumPy dtype (numbers, bools, naive datetimes) travel both ways through
+    shared memory segments, so only their names and shapes are pickled; object, categorical and
+    tz-aware columns, or every column before Python 3.8, are pickled.
+
+    Args:
+        tasks (list):   [(column_name, filtered Series, [(op, arg), ...]), ...]
+        index (Index):  Index of the cleaned frame
+        maxworkers (int):   Number of worker processes
+
+    Returns:
+        {column_name: cleaned Series with `index`}
+
+    """
+    partitions = [[] for i in range(min(maxworkers, len(tasks)))]
+    costs = [0] * len(partitions)
+    segments = []
+    if shared_memory is not None:
+        # workers inherit this tracker, so segments they create are released when the parent unlinks them
+        resource_tracker.ensure_running()
+    try:
+        # largest columns first, each to the cheapest partition so far
+        for col, series, ops in sorted(tasks, key=_column_cost, reverse=True):
+            column, segment = _pack_column(series)
+            if segment is not None:
+                segments.append(segment)
+            i = costs.index(min(costs))
+            partitions[i].append((col, column, ops))
+            costs[i] += _column_cost((col, series, ops))
+        log.info("Cleaning {0} columns in {1} processes...".format(len(tasks), len(partitions)))
+        cleaned = {}
+        if partitions:
+            with ProcessPoolExecutor(max_workers=len(partitions)) as executor:
+                for results in executor.map(_run_partition, partitions):
+                    for col, column in results:
+                        cleaned[col] = _unpack_column(column, unlink=True)
+                        cleaned[col].index = index
+        return cleaned
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+
+def _column_cost(task):
+    """Rough cost of a column's operations: bytes times operations, object columns weigh more"""
+    col, series, ops = task
+    weight = 1 if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM' else 4
+    return series.shape[0] * getattr(series.dtype, 'itemsize', 8) * weight * len(ops)
+
+
+def _run_partition(partition):
+    """Worker side of run_parallel, cleans the columns of one partition"""
+    results = []
+    for col, column, ops in partition:
+        series = _unpack_column(column)
+        result, segment = _pack_column(run_ops(series, ops).rename(col))
+        if segment is not None:
+            segment.close()  # unlinked by the parent once copied
+        results.append((col, result))
+        del series
+    return results
+
+
+def _pack_column(series):
+    """Returns a picklable column, with its values in a new shared memory segment when possible"""
+    if (shared_memory is None or not isinstance(series.dtype, np.dtype) or series.dtype.kind not in 'biufcmM' or
+            series.shape[0] == 0):
+        return ('series', series.reset_index(drop=True)), None
+    segment = shared_memory.SharedMemory(create=True, size=series.values.nbytes)
+    values = np.ndarray(series.shape, dtype=series.dtype, buffer=segment.buf)
+    values[:] = series.values
+    del values
+    return ('shm', segment.name, series.dtype.str, series.shape, series.name), segment
+
+
+def _unpack_column(column, unlink=False):
+    """Returns the Series of a packed column, copying shared memory values out of their segment"""
+    if column[0] == 'series':
+        return column[1]
+    kind, name, dtype, shape, colname = column
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf).copy()
+    finally:
+        segment.close()
+        if unlink:
+            segment.unlink()
+    return pd.Series(values, name=colname)
+
+
+def apply_op(series, op, arg):
+    """Applies one compiled cleaning operation to a column"""
+    if op == 'strip':
+        return series.str.strip(arg)
+    if op == 'date_to_ordinal':
+        return to_ordinal(series)
+    if op == 'zfill':
+        return zfill(series, arg)
+    if op == 'fillna':
+        return series.fillna(arg)
+    if op == 'replace':
+        return arg.replace([series])[0]
+    if op == 'astype':
+        return series.astype(arg)
+    raise ValueError('Unknown cleaning operation {0}'.format(op))
+
+
+def to_ordinal(series):
+    """Returns the proleptic Gregorian ordinal of each date, like [date.toordinal() for date in series]
+
+    Naive datetime64 columns without missing values are converted with datetime64 arithmetic,
+    anything else (tz-aware, object dates, NaT, which raises, empty) falls back to date.toordinal().
+
+    """
+    if (isinstance(series.dtype, np.dtype) and series.dtype.kind == 'M' and series.shape[0] > 0 and
+            not series.isnull().any()):
+        days = series.values.astype('datetime64[D]').astype('int64') + UNIX_EPOCH_ORDINAL
+        return pd.Series(days, index=series.index, name=series.name)
+    return pd.Series([date.toordinal() for date in series], index=series.index, name=series.name)
+
+
+def zfill(series, width):
+    """Returns str(value).zfill(width) of each value as an object column
+
+    Integer, bool and all-string columns are factorized so each distinct value is padded once.
+    Other columns (floats, where 0.0 and -0.0 share a key, mixed objects, nulls) are padded row by row.
+
+    """
+    values = series.values
+    if isinstance(values, np.ndarray) and (values.dtype.kind in 'iub' or
+                                           (values.dtype.kind == 'O' and infer_dtype(values) == 'string')):
+        codes, uniques = pd.factorize(values)
+        if (codes >= 0).all():
+            padded = np.array([str(value).zfill(width) for value in uniques], dtype=object)
+            return pd.Series(padded.take(codes), index=series.index, name=series.name)
+    return pd.Series([str(row).zfill(width) for row in series], index=series.index, name=series.name)
+
+
+class RegexGroup:
+    """The compiled patterns of one metadata regex_group, applied to all of its columns at once
+
+    Gives the same result as `series.replace(to_replace=regex, value=regex_replace, regex=True)` on
+    each column: every pattern is substituted in order into the string values of object columns.
+    The group's object columns are stacked and each distinct string is substituted once, strings
+    that match none of the patterns (checked with one combined pattern) are skipped.
+
+    Attributes:
+        regex (list):   Patterns, in the order they are applied
+        regex_replace (list):   Replacement of each pattern
+        patterns (list):    Compiled patterns
+        prefilter (re.Pattern): Alternation of all patterns, None if they use groups (backreferences
+                                would be renumbered) or cannot be combined
+
+    """
+
+    def __init__(self, regex, regex_replace):
+        if len(regex) != len(regex_replace):
+            raise ValueError('Replacement lists must match in length. Expecting {0} got {1} '.format(
+                len(regex), len(regex_replace)))
+        self.regex = list(regex)
+        self.regex_replace = list(regex_replace)
+        self.patterns = [re.compile(r) for r in self.regex]
+        self.prefilter = None
+        if all(pattern.groups == 0 for pattern in self.patterns):
+            try:
+                self.prefilter = re.compile('|'.join('(?:{0})'.format(r) for r in self.regex))
+            except re.error:
+                pass
+
+    def sub(self, value):
+        """Returns `value` with every pattern substituted in order, as Series.replace does"""
+        if self.prefilter is not None and self.prefilter.search(value) is None:
+            return value
+        original = value
+        sequential = _sequential_replace()
+        for pattern, repl in zip(self.patterns, self.regex_replace):
+            if sequential or pattern.search(original) is not None:
+                value = pattern.sub(repl, value)
+        return value
+
+    def replace(self, columns):
+        """Returns the group's columns (list of Series) with the patterns substituted
+
+        Columns that are not object dtype, or hold no strings, go through `Series.replace` so
+        pandas' handling of other dtypes and its dtype inference are unchanged.
+
+        """
+        stacked = [i for i, series in enumerate(columns) if series.dtype == object and series.shape[0] > 0]
+        results = [series.replace(to_replace=self.regex, value=self.regex_replace, regex=True)
+                   if i not in stacked else None for i, series in enumerate(columns)]
+        if not stacked:
+            return results
+        values = np.concatenate([columns[i].values for i in stacked])
+        codes, uniques = pd.factorize(values)
+        is_str = np.array([isinstance(value, str) for value in uniques] + [False], dtype=bool)
+        subbed = np.empty(len(uniques) + 1, dtype=object)
+        subbed[:-1] = [self.sub(value) if isinstance(value, str) else value for value in uniques]
+        changed = np.array([bool(is_str[j]) and subbed[j] != uniques[j] for j in range(len(uniques))] + [False],
+                           dtype=bool)
+        start = 0
+        for i in stacked:
+            series = columns[i]
+            column_codes = codes[start:start + series.shape[0]]  # -1 (missing) indexes the trailing False
+            start += series.shape[0]
+            if not is_str[column_codes].any():
+                results[i] = series.replace(to_replace=self.regex, value=self.regex_replace, regex=True)
+                continue
+            column_values = series.values.copy()
+            hit = changed[column_codes]
+            column_values[hit] = subbed[column_codes[hit]]
+            results[i] = pd.Series(column_values, index=series.index, name=series.name, dtype=object)
+        return results
+
+
+_regex_groups = {}  # {(regex, regex_replace): RegexGroup}
+_sequential = []
+
+
+def _sequential_replace():
+    """Whether this pandas' Series.replace matches each pattern against the previous pattern's output
+
+    Older pandas substitutes the patterns one after the other; newer pandas only substitutes a
+    pattern into the values whose original string matched it. Probed once per process.
+
+    """
+    if not _sequential:
+        probe = pd.Series(['a'], dtype=object).replace(to_replace=['a', 'b'], value=['b', 'c'], regex=True)
+        _sequential.append(probe.iloc[0] == 'c')
+    return _sequential[0]
+
+
+def regex_group(regex, regex_replace):
+    """Returns the compiled RegexGroup of a pattern and replacement list, compiling it once per process"""
+    key = (tuple(regex), tuple(regex_replace))
+    if key not in _regex_groups:
+        _regex_groups[key] = RegexGroup(regex, regex_replace)
+    return _regex_groups[key]
+
+
+_plans = OrderedDict()  # {metadata hash: CleaningPlan}, most recently used last
+_PLAN_CACHE_SIZE = 16
+
+
+def compile_plan(metadata):
+    """Returns the CleaningPlan for `metadata`, compiled once per distinct metadata content"""
+    key = metadata_hash(metadata)
+    plan = _plans.pop(key, None)
+    if plan is None:
+        plan = CleaningPlan(metadata)
+    _plans[key] = plan
+    while len(_plans) > _PLAN_CACHE_SIZE:
+        _plans.popitem(last=False)
+    return plan
+
+
+def metadata_hash(metadata):
+    return hashlib.sha1(metadata.to_json(orient='split').encode('utf-8')).hexdigest()
+
+
+def _flagged(metadata, flagcol, flag="1"):
+    return metadata[metadata[flagcol].isin([flag])]['column_name'].tolist()
+
+
 def drop_rows_with_na(tmpdf, metadata, copy=True):
     if copy is True:
         tmpdf = tmpdf.copy()
     cols = metadata[metadata['drop_rows_with_na'].isin(["1"])]['column_name'].tolist()
     log.info("Dropping rows with NA for columns {0}".format(cols))
-    return (tmpdf.dropna(subset=[cols]))
+    return (tmpdf.dropna(subset=cols))
 
 
 def derive_to_bool(tmpdf, metadata, copy=True):
@@ -72,7 +1009,7 @@ def date_to_ordinal(tmpdf, metadata, copy=True):
     cols = metadata[metadata['date_to_ordinal'].isin(["1"])]['column_name'].tolist()
     for col in cols:
         log.info("Converting {0} date to ordinal...".format(col))
-        tmpdf[col] = [date.toordinal() for date in tmpdf[col]]
+        tmpdf[col] = to_ordinal(tmpdf[col])
     return (tmpdf)
 
 
@@ -83,10 +1020,18 @@ def zfill_col(tmpdf, metadata, copy=True):
     for col in cols:
         z = metadata[metadata['column_name'] == col]['z'].item()
         log.info("zfilling column {0} with {1}".format(col, z))
-        tmpdf[col] = [str(row).zfill(int(z)) for row in tmpdf.loc[:, col]]
+        tmpdf[col] = zfill(tmpdf.loc[:, col], int(z))
     return (tmpdf)
 
 
+def fill_value(col, fill_with):
+    """Returns the fill value for a metadata 'fill_na_with' entry, raising ValueError for unrecognized entries"""
+    if fill_with not in FILL_VALUES:
+        raise ValueError('Unrecognized fill_na_with {0!r} for column {1}, expecting one of {2}'.format(
+            fill_with, col, sorted(FILL_VALUES)))
+    return FILL_VALUES[fill_with]
+
+
 def fill_na_with(tmpdf, metadata, copy=True):
     if copy is True:
         tmpdf = tmpdf.copy()
@@ -94,13 +1039,7 @@ def fill_na_with(tmpdf, metadata, copy=True):
     log.info("Filling columns with NA")
     for col in cols:
         fill_with = metadata[metadata['column_name'] == col]['fill_na_with'].item()
-        if fill_with == 'TRUE':
-            fill = True
-        if fill_with == 'FALSE':
-            fill = False
-        if fill_with == '0':
-            fill = 0
-        tmpdf[col] = tmpdf[col].fillna(fill)
+        tmpdf[col] = tmpdf[col].fillna(fill_value(col, fill_with))
     return (tmpdf)
 
 
@@ -113,8 +1052,8 @@ def replace(tmpdf, metadata, copy=True):
         regex = [r for i in set(metadata[metadata['regex_group'].isin([group])]['regex']) for r in i.split(" | ")]
         regex_replace = [rr for i in set(metadata[metadata['regex_group'].isin([group])]['regex_replace']) for rr in i.split(" | ")]
         log.info("Replacing column group {0} regex {1} with {2}".format(group, regex, regex_replace))
-        for col in cols:
-            tmpdf[col] = tmpdf.loc[:, col].replace(to_replace=regex, value=regex_replace, regex=True)
+        for col, result in zip(cols, regex_group(regex, regex_replace).replace([tmpdf.loc[:, col] for col in cols])):
+            tmpdf[col] = result
     return (tmpdf)
 
 
@@ -190,19 +190,18 @@ def plot_pca_expvar_to_pdf(modelsession, directory, filename='pca_explained_vari
     log.info('Creating PDF of PCA explained variance plots...')
     file_path = os.path.join(directory, filename)
     pp = PdfPages(file_path)
-    plot_pca_expvar(modelsession.pca, modelsession.dataset_name, expvar=1, ratio=1)
-    plot_pca_expvar(modelsession.pca_std, modelsession.dataset_name, expvar=1, ratio=1)
-    plot_pca_expvar(modelsession.pca_mms, modelsession.dataset_name, expvar=1, ratio=1)
+    # pca_mms for dense sessions, pca_mas (MaxAbsScaler) for sparse sessions
+    pcas = [getattr(modelsession, name) for name in ['pca', 'pca_std', 'pca_mms', 'pca_mas'] if hasattr(modelsession, name)]
+    for pca in pcas:
+        plot_pca_expvar(pca, modelsession.dataset_name, expvar=1, ratio=1)
     pp.savefig()
     plt.close()
-    plot_pca_expvar(modelsession.pca, modelsession.dataset_name, expvar=1, ratio=0)
-    plot_pca_expvar(modelsession.pca_std, modelsession.dataset_name, expvar=1, ratio=0)
-    plot_pca_expvar(modelsession.pca_mms, modelsession.dataset_name, expvar=1, ratio=0)
+    for pca in pcas:
+        plot_pca_expvar(pca, modelsession.dataset_name, expvar=1, ratio=0)
     pp.savefig()
     plt.close()
-    plot_pca_expvar(modelsession.pca, modelsession.dataset_name, expvar=0, ratio=1)
-    plot_pca_expvar(modelsession.pca_std, modelsession.dataset_name, expvar=0, ratio=1)
-    plot_pca_expvar(modelsession.pca_mms, modelsession.dataset_name, expvar=0, ratio=1)
+    for pca in pcas:
+        plot_pca_expvar(pca, modelsession.dataset_name, expvar=0, ratio=1)
     pp.savefig()
     plt.close()
     pp.close()
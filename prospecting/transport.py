@@ -0,0 +1,484 @@
+import os
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from contextlib import contextmanager
+import httplib2
+from apiclient.errors import HttpError
+
+from prospecting.errors import CassetteError
+
+import logging
+log = logging.getLogger('prospecting.transport')
+
+
+class HttpPool:
+    """Shared pool of persistent httplib2.Http objects, checked out per request and returned after
+
+    httplib2.Http is not thread-safe, so an Http object is leased to one caller at a time and put
+    back in the pool, keyed by credentials object, when the caller is done. Each Http keeps its
+    keep-alive connections open per host, so requests sent from short-lived worker threads reuse the
+    connections to googleapis.com opened by earlier requests with the same credentials.
+
+    Example:
+        from prospecting.transport import http_pool
+        with http_pool.lease(credentials) as http:  # authorized Http, returned to the pool on exit
+            resp, content = http.request(uri)
+        http_pool.metrics()
+
+    """
+
+    def __init__(self, timeout=None):
+        """Initialize HttpPool class
+
+        Args:
+            timeout (float):    Socket timeout in seconds for new connections, Ex: 60
+
+        """
+        self.timeout = timeout
+        self._idle = {}  # {id(credentials): (credentials, [Http, ...])}
+        self._lock = threading.Lock()
+        self.cassette = None
+        self.replaying = False
+        self._generation = 0  # bumped when the transport changes, Http objects of older generations are dropped
+        self.connection_types = {
+            'http': _timed_connection(httplib2.HTTPConnectionWithTimeout, self),
+            'https': _timed_connection(httplib2.HTTPSConnectionWithTimeout, self),
+        }
+        self.reset_metrics()
+
+    def http(self, credentials=None):
+        """Returns a new Http object owned by the caller, authorized if credentials are given"""
+        if self.replaying:
+            http = ReplayHttp(self.cassette)
+        elif self.cassette is not None:
+            http = RecordingHttp(self, self.cassette, timeout=self.timeout)
+        else:
+            http = _PooledHttp(self, timeout=self.timeout)
+        if credentials is not None and not self.replaying:
+            http = credentials.authorize(http)
+        self._count('misses')
+        log.debug('New pooled Http for thread {0}'.format(threading.current_thread().name))
+        return http
+
+    @contextmanager
+    def lease(self, credentials=None):
+        """Checks out an idle Http object for `credentials`, or a new one, and returns it to the pool on exit"""
+        with self._lock:
+            generation = self._generation
+            entry = self._idle.get(id(credentials))
+            http = entry[1].pop() if entry and entry[1] else None
+        if http is None:
+            http = self.http(credentials)
+        else:
+            self._count('hits')
+        try:
+            yield http
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._idle.setdefault(id(credentials), (credentials, []))[1].append(http)
+
+    def use_cassette(self, path, mode='replay', latency=0.0, jitter=0.0, errorrate=0.0, errorstatus=503, seed=None):
+        """Records HTTP exchanges to, or replays them from, a cassette file
+
+        In 'record' mode requests go to Google as usual and each exchange is saved to `path` when
+        stop_cassette() is called. In 'replay' mode no network or credentials are used: responses are
+        served from the cassette, after an injected delay of `latency` +/- `jitter` seconds, and a
+        share `errorrate` of requests fails with `errorstatus`, which exercises the scheduler's retries.
+        GoogleApi.authenticate skips the credentials flow while replaying.
+
+        Example:
+            http_pool.use_cassette('sheets_get.json', mode='replay', latency=0.15, errorrate=0.01)
+            ss = SheetsApi(spreadsheetid='17R9V5...')
+            ss.authenticate()
+            md = ss.get('metadata', headerrow=1)
+            http_pool.stop_cassette()
+
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.cassette = Cassette(path, latency=latency, jitter=jitter, errorrate=errorrate,
+                                 errorstatus=errorstatus, seed=seed)
+        if mode == 'replay' and not self.cassette.interactions:
+            raise CassetteError('No recorded interactions in {0}'.format(path))
+        self.replaying = mode == 'replay'
+        self._drop_idle()
+        log.info('Using cassette {0} in {1} mode'.format(path, mode))
+        return self.cassette
+
+    def stop_cassette(self):
+        """Returns to live HTTP, saving the cassette if it was recording"""
+        cassette = self.cassette
+        if cassette is not None and not self.replaying:
+            cassette.save()
+        self.cassette = None
+        self.replaying = False
+        self._drop_idle()
+        return cassette
+
+    def metrics(self):
+        """Returns pool usage counters
+
+        Returns:
+            {
+              "hits": int, leases served by an idle Http object
+              "misses": int, Http objects created
+              "requests": int, HTTP requests sent through pooled Http objects
+              "connects": int, new connections opened
+              "connect_time": float, total seconds spent opening connections
+              "avg_connect_time": float,
+              "connection_reuse": float, share of requests sent on an already open connection
+            }
+
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['avg_connect_time'] = (metrics['connect_time'] / metrics['connects']) if metrics['connects'] else 0.0
+        metrics['connection_reuse'] = (1 - float(metrics['connects']) / metrics['requests']) if metrics['requests'] else 0.0
+        return metrics
+
+    def _drop_idle(self):
+        with self._lock:
+            self._generation += 1
+            self._idle = {}
+
+    def reset_metrics(self):
+        with self._lock:
+            self._metrics = {'hits': 0, 'misses': 0, 'requests': 0, 'connects': 0, 'connect_time': 0.0}
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._metrics[name] += value
+
+    def _record_connect(self, seconds):
+        with self._lock:
+            self._metrics['connects'] += 1
+            self._metrics['connect_time'] += seconds
+
+
+class _PooledHttp(httplib2.Http):
+    """httplib2.Http which opens connections through its pool's timed connection types"""
+
+    def __init__(self, pool, **kwargs):
+        httplib2.Http.__init__(self, **kwargs)
+        self._pool = pool
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        if connection_type is None:
+            connection_type = self._pool.connection_types.get(uri.split(':', 1)[0].lower())
+        self._pool._count('requests')
+        return httplib2.Http.request(self, uri, method, body, headers, redirections, connection_type)
+
+
+class Cassette:
+    """HTTP exchanges recorded as JSON, matched on method, URI and body
+
+    Exchanges with the OAuth token endpoints are never recorded, so cassettes hold no access or
+    refresh tokens. Replaying needs no credentials and never requests a token.
+
+    """
+
+    TOKEN_URIS = ('https://oauth2.googleapis.com/token',
+                  'https://accounts.google.com/o/oauth2/token',
+                  'https://www.googleapis.com/oauth2/v4/token')
+
+    def __init__(self, path, latency=0.0, jitter=0.0, errorrate=0.0, errorstatus=503, seed=None):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = errorrate
+        self.error_status = errorstatus
+        self.random = random.Random(seed)
+        self.interactions = []
+        self.served = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._positions = {}
+        if os.path.isfile(path):
+            with open(path) as f:
+                self.interactions = json.load(f)
+        self._index = {}
+        for interaction in self.interactions:
+            self._index.setdefault(interaction['key'], []).append(interaction)
+
+    @staticmethod
+    def make_key(method, uri, body):
+        if body is not None and not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        if body:
+            body = Cassette.normalize_multipart(body)
+        try:
+            # apiclient serializes dicts without sorting keys
+            body = json.dumps(json.loads(body.decode('utf-8')), sort_keys=True).encode('utf-8')
+        except (AttributeError, ValueError):
+            pass
+        return '{0} {1} {2}'.format(method, uri, hashlib.sha1(body or b'').hexdigest())
+
+    @staticmethod
+    def normalize_multipart(body):
+        """Returns a batch request body without the parts that change between runs
+
+        apiclient batch bodies are MIME multipart with a random boundary, a random Content-ID base
+        per batch, and the authorization header of each sub-request; these are replaced or dropped so
+        the same batch gets the same key when it is recorded and replayed.
+
+        """
+        match = re.match(br'\s*--(\S+)\r?\n', body)
+        if match is None or not re.search(br'(?im)^content-id:', body):
+            return body
+        body = body.replace(match.group(1), b'BOUNDARY')
+        body = re.sub(br'(?im)^(content-id:\s*<)[^>+]*\+', br'\1+', body)
+        return re.sub(br'(?im)^authorization:[^\r\n]*\r?\n', b'', body)
+
+    def record(self, method, uri, body, response, content):
+        if uri.split('?', 1)[0] in self.TOKEN_URIS:
+            log.debug('Not recording token exchange with {0}'.format(uri))
+            return
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        interaction = {'key': self.make_key(method, uri, body),
+                       'method': method,
+                       'uri': uri,
+                       'response': dict(response),
+                       'content': base64.b64encode(content).decode('ascii')}
+        with self._lock:
+            self.interactions.append(interaction)
+            self._index.setdefault(interaction['key'], []).append(interaction)
+
+    def replay(self, method, uri, body):
+        """Returns the next recorded (response, content) for the request, cycling through repeats"""
+        key = self.make_key(method, uri, body)
+        with self._lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+            recorded = self._index.get(key)
+            if recorded:
+                position = self._positions.get(key, 0)
+                self._positions[key] = position + 1
+                interaction = recorded[position % len(recorded)]
+            self.served += 1
+            self.errors += int(fail)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            content = json.dumps({'error': {'code': self.error_status, 'message': 'Injected error'}})
+            return httplib2.Response({'status': str(self.error_status)}), content.encode('utf-8')
+        if not recorded:
+            raise CassetteError('No recorded response for {0} {1}'.format(method, uri))
+        return httplib2.Response(interaction['response']), base64.b64decode(interaction['content'])
+
+    def save(self):
+        with self._lock:
+            with open(self.path, 'w') as f:
+                json.dump(self.interactions, f)
+        log.info('Saved {0} interactions to {1}'.format(len(self.interactions), self.path))
+
+
+class RecordingHttp(_PooledHttp):
+    """Pooled Http which saves every exchange to a cassette"""
+
+    def __init__(self, pool, cassette, **kwargs):
+        _PooledHttp.__init__(self, pool, **kwargs)
+        self._cassette = cassette
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        response, content = _PooledHttp.request(self, uri, method, body, headers, redirections, connection_type)
+        self._cassette.record(method, uri, body, response, content)
+        return response, content
+
+
+class ReplayHttp:
+    """Stand-in for httplib2.Http serving responses from a cassette"""
+
+    def __init__(self, cassette):
+        self._cassette = cassette
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        return self._cassette.replay(method, uri, body)
+
+
+def _timed_connection(base, pool):
+    class TimedConnection(base):
+        def connect(self):
+            t0 = time.time()
+            try:
+                base.connect(self)
+            finally:
+                pool._record_connect(time.time() - t0)
+    TimedConnection.__name__ = 'Timed' + base.__name__
+    return TimedConnection
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `requests` tokens per `seconds`, holding at most `requests` tokens"""
+
+    def __init__(self, requests, seconds):
+        self.rate = float(requests) / seconds
+        self.capacity = float(requests)
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+    def delay(self, n=1):
+        """Returns seconds until `n` tokens are available, 0 if they are available now"""
+        n = min(n, self.capacity)
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+    def consume(self, n=1):
+        self.tokens -= n
+
+
+class RequestScheduler:
+    """Rate limits, prioritizes and retries requests to Google APIs
+
+    Each request takes a token from the bucket of its API and from the bucket of its (API, user)
+    pair before it is sent. Limits default to the published per-100-seconds quotas and can be
+    changed with set_limit() and set_user_limit().
+
+    Requests are sent in one of two priority lanes. 'interactive' requests (reads, by default)
+    are always served first; 'bulk' requests (writes) wait while an interactive request is waiting
+    for a token from one of the same buckets, so notebook reads are not starved by a grid search's
+    reporting writes, and writes to one API do not wait on reads from another.
+
+    Requests failing with 429, 5xx or a 403 rate limit error are retried with full-jitter
+    exponential backoff: the n-th retry waits a random time between 0 and
+    min(backoffmax, backoffbase * 2**n) seconds.
+
+    """
+
+    LANES = ('interactive', 'bulk')
+
+    def __init__(self, maxretries=5, backoffbase=1.0, backoffmax=64.0):
+        """Initialize RequestScheduler class
+
+        Args:
+            maxretries (int):   Number of retries before an error is raised, Ex: 5
+            backoffbase (float):    Base backoff in seconds, Ex: 1.0
+            backoffmax (float): Maximum backoff in seconds, Ex: 64.0
+
+        """
+        self.max_retries = maxretries
+        self.backoff_base = backoffbase
+        self.backoff_max = backoffmax
+        self.limits = {'sheets': (500, 100), 'drive': (10000, 100)}  # {apiname: (requests, seconds)}
+        self.user_limits = {'sheets': (100, 100), 'drive': (1000, 100)}
+        self.buckets = {}
+        self.retries = 0
+        self._cond = threading.Condition()
+        self._waiting = {}  # {bucket key: number of interactive requests waiting for it}
+
+    def set_limit(self, apiname, requests, seconds=100):
+        """Sets the request quota shared by all users of an API, Ex: set_limit('sheets', 500, 100)"""
+        with self._cond:
+            self.limits[apiname] = (requests, seconds)
+            self.buckets.pop((apiname,), None)
+
+    def set_user_limit(self, apiname, requests, seconds=100):
+        """Sets the request quota of each user of an API, Ex: set_user_limit('sheets', 100, 100)"""
+        with self._cond:
+            self.user_limits[apiname] = (requests, seconds)
+            for key in [key for key in self.buckets if len(key) == 2 and key[0] == apiname]:
+                del self.buckets[key]
+
+    def acquire(self, apiname, user=None, priority='interactive', n=1):
+        """Blocks until `n` tokens are available for `apiname` and `user` in the given priority lane"""
+        if priority not in self.LANES:
+            raise ValueError('priority must be one of {0}'.format(self.LANES))
+        keys = self._bucket_keys(apiname, user)
+        buckets = self._buckets(apiname, user)
+        interactive = priority == 'interactive'
+        with self._cond:
+            if interactive:
+                for key in keys:
+                    self._waiting[key] = self._waiting.get(key, 0) + 1
+            try:
+                while True:
+                    delay = max([bucket.delay(n) for bucket in buckets] + [0.0])
+                    blocked = not interactive and any(self._waiting.get(key, 0) > 0 for key in keys)
+                    if delay == 0.0 and not blocked:
+                        for bucket in buckets:
+                            bucket.consume(n)
+                        return
+                    self._cond.wait(delay if delay > 0 else 0.05)
+            finally:
+                if interactive:
+                    for key in keys:
+                        self._waiting[key] -= 1
+                        if not self._waiting[key]:
+                            del self._waiting[key]
+                self._cond.notify_all()
+
+    def execute(self, request, http, apiname, user=None, priority=None):
+        """Executes an apiclient HttpRequest once tokens are available, retrying on quota and server errors
+
+        Params:
+            request (HttpRequest):  Request built from a service object
+            http (httplib2.Http):   Http object to send the request with
+            apiname (str):  Name of the API the request is for, Ex: 'sheets'
+            user (str): Identifies the user the quota applies to, Ex: credential path
+            priority (str): 'interactive' or 'bulk', defaults to 'interactive' for GET requests, else 'bulk'
+
+        """
+        if priority is None:
+            priority = 'interactive' if request.method == 'GET' else 'bulk'
+        attempt = 0
+        while True:
+            self.acquire(apiname, user, priority)
+            try:
+                return request.execute(http=http)
+            except HttpError as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                backoff = self.backoff(attempt)
+                log.warning('{0} {1} returned {2}, retrying in {3:.1f} seconds'.format(
+                    request.method, apiname, e.resp.status, backoff))
+                attempt += 1
+                time.sleep(backoff)
+
+    def backoff(self, attempt):
+        """Counts a retry and returns the full-jitter backoff in seconds before retry number `attempt`"""
+        with self._cond:
+            self.retries += 1
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _bucket_keys(apiname, user):
+        return [(apiname,), (apiname, user)] if user is not None else [(apiname,)]
+
+    def _buckets(self, apiname, user):
+        with self._cond:
+            buckets = []
+            for key in self._bucket_keys(apiname, user):
+                limit = (self.limits if len(key) == 1 else self.user_limits).get(apiname)
+                if limit is None:
+                    continue
+                if key not in self.buckets:
+                    self.buckets[key] = TokenBucket(*limit)
+                buckets.append(self.buckets[key])
+            return buckets
+
+
+def is_retryable(error):
+    status = int(error.resp.status)
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+        return 'rateLimitExceeded' in content or 'userRateLimitExceeded' in content
+    return False
+
+
+http_pool = HttpPool()
+scheduler = RequestScheduler()
@@ -2,11 +2,19 @@
 
 import sys
 import os
+import json
 import pickle
-import httplib2
 import time
 from functools import wraps
+from collections import OrderedDict
 import pandas as pd
+from prospecting.transport import http_pool
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
 from prospecting.env import (LOG_FILE,
                              LOG_FILE_DEBUG,
                              TMPDIR,
@@ -72,6 +80,9 @@ log_config_dict = {
         'prospecting.utils': {
             'handlers': ['console', 'file']
         },
+        'prospecting.transport': {
+            'handlers': ['console', 'file']
+        },
     },
     'root': {
         'level': 'DEBUG',
@@ -126,8 +137,8 @@ def print_logfiles():
 
 
 def download(url):
-    h = httplib2.Http()
-    resp, content = h.request(url, 'GET')
+    with http_pool.lease() as h:
+        resp, content = h.request(url, 'GET')
     return (resp, content)
 
 
@@ -166,3 +177,151 @@ def unpckl(file, path=DATADIR):
         log.info("Pickle file does not exist, returning None")
         unpickled_object = None
     return (unpickled_object)
+
+
+def write_parquet_part(dataframe, directory, schema=None):
+    """Writes `dataframe` as the next part file of a Parquet dataset directory
+
+    Args:
+        dataframe (DataFrame):  Rows to add to the dataset, the index is not written
+        directory (str):    Dataset directory, created if missing
+        schema (pyarrow.Schema):    Schema to cast the part to, keeps parts readable as one dataset
+
+    Returns:
+        Path of the part file written
+
+    """
+    if pq is None:
+        raise ImportError('pyarrow is required to write Parquet files, install with `pip install pyarrow`')
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    n_parts = len([f for f in os.listdir(directory) if f.endswith('.parquet')])
+    part_path = os.path.join(directory, 'part-{0:05d}.parquet'.format(n_parts))
+    table = pa.Table.from_pandas(dataframe, schema=schema, preserve_index=False)
+    pq.write_table(table, part_path)
+    log.debug("Wrote {0} rows to {1}".format(dataframe.shape[0], part_path))
+    return part_path
+
+
+def parquet_schema(dataframe):
+    """Returns the Parquet schema of `dataframe` for writing a dataset one part at a time
+
+    Columns that are all missing have no type of their own, they are typed as strings so that
+    later parts with values can be cast to the same schema.
+
+    Ex:
+        schema = parquet_schema(first_chunk)
+        for chunk in chunks:
+            write_parquet_part(chunk, directory, schema=schema)
+
+    """
+    if pa is None:
+        raise ImportError('pyarrow is required to write Parquet files, install with `pip install pyarrow`')
+    schema = pa.Schema.from_pandas(dataframe, preserve_index=False)
+    return pa.schema([pa.field(field.name, pa.string()) if field.type == pa.null() else field
+                      for field in schema])
+
+
+def read_parquet_dir(directory):
+    """Reads every part file of a Parquet dataset directory into one DataFrame"""
+    if pq is None:
+        raise ImportError('pyarrow is required to read Parquet files, install with `pip install pyarrow`')
+    parts = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.parquet'))
+    return pd.concat([pq.read_table(part).to_pandas() for part in parts], ignore_index=True)
+
+
+class LruIndex:
+    """Least recently used index of the files in a cache directory, persisted as `index.json`
+
+    Each entry is a dict with at least `file`, the name of the entry's file in `cachedir`, and, when
+    `maxbytes` is set, `bytes`, the size of that file. Entries are kept in use order; once there are
+    more than `maxentries` entries or their `bytes` sum to more than `maxbytes`, the least recently
+    used entries are removed along with their files. Changes, hits included, are kept in memory
+    until flush() writes `index.json`, so a run with many hits and puts writes it once.
+
+    Ex:
+        index = LruIndex(cachedir, maxentries=256)
+        entry = index.get(key)  # None if missing, else marks `key` as most recently used
+        index.put(key, {'file': key + '.p'})
+        index.flush()
+
+    """
+
+    def __init__(self, cachedir, maxentries=None, maxbytes=None):
+        """Initialize LruIndex class
+
+        Args:
+            cachedir (str): Directory holding the cached files and `index.json`, created if missing
+            maxentries (int):   Maximum number of entries, unlimited if None, Ex: 256
+            maxbytes (int): Maximum summed `bytes` of the entries, unlimited if None, Ex: 2 * 1024 ** 3
+
+        """
+        self.cache_dir = cachedir
+        self.max_entries = maxentries
+        self.max_bytes = maxbytes
+        self.index_path = os.path.join(cachedir, 'index.json')
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        self.entries = OrderedDict()
+        self.dirty = False
+        if os.path.isfile(self.index_path):
+            with open(self.index_path) as f:
+                self.entries = OrderedDict(json.load(f))
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def items(self):
+        return list(self.entries.items())
+
+    def path(self, key):
+        """Returns the path of the file of `key`"""
+        return os.path.join(self.cache_dir, self.entries[key]['file'])
+
+    def get(self, key):
+        """Returns the entry of `key` and marks it most recently used, or None if missing"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.dirty = True
+        return entry
+
+    def put(self, key, entry):
+        """Adds or replaces the entry of `key` as the most recently used, then evicts"""
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        self._evict()
+        self.dirty = True
+
+    def remove(self, *keys):
+        """Removes the entries of `keys` and their files"""
+        for key in keys:
+            self._delete(key)
+        self.dirty = True
+
+    def flush(self):
+        """Writes `index.json` if the index changed since it was last written"""
+        if self.dirty:
+            self.save()
+
+    def save(self):
+        with open(self.index_path, 'w') as f:
+            json.dump(list(self.entries.items()), f)
+        self.dirty = False
+
+    def _evict(self):
+        size = sum(entry['bytes'] for entry in self.entries.values()) if self.max_bytes is not None else 0
+        while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+                                (self.max_bytes is not None and size > self.max_bytes)):
+            key, entry = next(iter(self.entries.items()))
+            size -= entry.get('bytes', 0)
+            self._delete(key)
+
+    def _delete(self, key):
+        path = self.path(key)
+        del self.entries[key]
+        if os.path.isfile(path):
+            os.remove(path)
@@ -0,0 +1,52 @@
+#! /usr/bin/env python
+"""Record or replay SheetsApi reads to benchmark the API layer offline
+
+Record once against Google, then replay anywhere without network or credentials:
+
+    python bench_api.py --spreadsheet 17R9V5... --sheets metadata raw_descr --cassette sheets.json --record
+    python bench_api.py --spreadsheet 17R9V5... --sheets metadata raw_descr --cassette sheets.json --latency 0.15
+"""
+import time
+import argparse
+
+from prospecting.api import SheetsApi
+from prospecting.transport import http_pool, scheduler
+
+
+def main(args):
+    http_pool.use_cassette(args.cassette,
+                           mode='record' if args.record else 'replay',
+                           latency=args.latency,
+                           jitter=args.jitter,
+                           errorrate=args.errorrate,
+                           seed=0)
+    ss = SheetsApi(spreadsheetid=args.spreadsheet)
+    ss.authenticate()
+    timings = []
+    for i in range(1 if args.record else args.n):
+        t0 = time.time()
+        for sheet in args.sheets:
+            ss.get(sheet)
+        ss.batchGet(args.sheets)
+        timings.append(time.time() - t0)
+    http_pool.stop_cassette()
+    timings.sort()
+    n_requests = len(args.sheets) + 1
+    print('runs: {0}, requests per run: {1}'.format(len(timings), n_requests))
+    print('median run: {0:.4f}s, p95 run: {1:.4f}s'.format(timings[len(timings) // 2],
+                                                          timings[int(len(timings) * 0.95)]))
+    print('throughput: {0:.1f} requests/s'.format(n_requests * len(timings) / sum(timings)))
+    print('retries: {0}, pool: {1}'.format(scheduler.retries, http_pool.metrics()))
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='benchmark SheetsApi reads from a cassette')
+    args_parser.add_argument('--spreadsheet', required=True, help='Spreadsheet id')
+    args_parser.add_argument('--sheets', nargs='+', required=True, help='Sheet names to read')
+    args_parser.add_argument('--cassette', required=True, help='Cassette file to record to or replay from')
+    args_parser.add_argument('--record', action='store_true', help='Record from Google instead of replaying')
+    args_parser.add_argument('--n', type=int, default=50, help='Number of replayed runs')
+    args_parser.add_argument('--latency', type=float, default=0.0, help='Injected latency in seconds')
+    args_parser.add_argument('--jitter', type=float, default=0.0, help='Injected latency jitter in seconds')
+    args_parser.add_argument('--errorrate', type=float, default=0.0, help='Share of replayed requests failing with 503')
+    main(args_parser.parse_args())
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+"""Benchmark the vectorized cleaning kernels in prospecting.process
+
+Each kernel is timed against the Python loop or per-column Series.replace it replaced on synthetic
+columns of each benchmark size, and their results compared. Edge cases are checked in tests/:
+
+    python bench_process.py
+    python bench_process.py --sizes 100000 1000000 --repeat 5
+"""
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from prospecting import process
+
+
+def loop_to_ordinal(series):
+    return pd.Series([date.toordinal() for date in series], index=series.index, name=series.name)
+
+
+def loop_zfill(series, width):
+    return pd.Series([str(row).zfill(width) for row in series], index=series.index, name=series.name)
+
+
+def timed(func, repeat):
+    timings = []
+    for i in range(repeat):
+        t0 = time.time()
+        result = func()
+        timings.append(time.time() - t0)
+    return min(timings), result
+
+
+def bench(n, repeat):
+    rs = np.random.RandomState(0)
+    columns = [('date_to_ordinal', pd.Series(pd.Timestamp('1950-01-01') + pd.to_timedelta(rs.randint(0, 30000, n), unit='D')),
+                process.to_ordinal, loop_to_ordinal),
+               ('zfill int', pd.Series(rs.randint(0, 99999, n)),
+                lambda s: process.zfill(s, 5), lambda s: loop_zfill(s, 5)),
+               ('zfill string', pd.Series(rs.randint(0, 99999, n).astype(str).astype(object)),
+                lambda s: process.zfill(s, 5), lambda s: loop_zfill(s, 5))]
+    for name, series, kernel, loop in columns:
+        t_kernel, expected = timed(lambda: kernel(series), repeat)
+        t_loop, result = timed(lambda: loop(series), repeat)
+        pd.testing.assert_series_equal(expected, result)
+        print('{0:>10} rows  {1:<16} loop: {2:8.3f}s  kernel: {3:8.3f}s  speedup: {4:6.1f}x'.format(
+            n, name, t_loop, t_kernel, t_loop / t_kernel))
+
+
+def bench_replace(n, repeat, ncols=3):
+    rs = np.random.RandomState(0)
+    names = np.array(['{0} {1}{2}'.format(word, i, suffix) for i, (word, suffix) in
+                      enumerate(zip(rs.choice(['acme', 'foo', 'bar', 'widget'], 50000),
+                                    rs.choice([', inc.', ' llc', ', corp', '', ' co.'], 50000)))], dtype=object)
+    columns = [pd.Series(names[rs.randint(0, len(names), n)], dtype=object, name='name{0}'.format(i))
+               for i in range(ncols)]
+    for column in columns:
+        column[rs.rand(n) < 0.05] = None
+    regex, regex_replace = [r',\s*', r'\.$', r'\s+(inc|llc|corp|co)$'], [' ', '', '']
+    t_loop, expected = timed(lambda: [column.replace(to_replace=regex, value=regex_replace, regex=True)
+                                      for column in columns], repeat)
+    t_kernel, result = timed(lambda: process.RegexGroup(regex, regex_replace).replace(columns), repeat)
+    for a, b in zip(expected, result):
+        pd.testing.assert_series_equal(a, b)
+    print('{0:>10} rows  {1:<16} loop: {2:8.3f}s  kernel: {3:8.3f}s  speedup: {4:6.1f}x'.format(
+        n, 'replace x{0} cols'.format(ncols), t_loop, t_kernel, t_loop / t_kernel))
+
+
+def main(args):
+    for n in args.sizes:
+        bench(n, args.repeat)
+        bench_replace(n, args.repeat)
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='benchmark prospecting.process kernels')
+    args_parser.add_argument('--sizes', nargs='+', type=int, default=[1000000, 10000000], help='Rows per column')
+    args_parser.add_argument('--repeat', type=int, default=3, help='Runs per timing, the fastest is reported')
+    main(args_parser.parse_args())
@@ -0,0 +1,205 @@
+"""Equivalence checks of the vectorized cleaning kernels and the fused engine in prospecting.process
+
+Each kernel is compared against the Python loop or per-column Series.replace it replaced, and
+clean_data against the step functions run in order on a metadata fixture:
+
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from prospecting import process
+
+
+def loop_to_ordinal(series):
+    return pd.Series([date.toordinal() for date in series], index=series.index, name=series.name)
+
+
+def loop_zfill(series, width):
+    return pd.Series([str(row).zfill(width) for row in series], index=series.index, name=series.name)
+
+
+def loop_fill(fill_with, fill):
+    if fill_with == 'TRUE':
+        fill = True
+    if fill_with == 'FALSE':
+        fill = False
+    if fill_with == '0':
+        fill = 0
+    return fill
+
+
+DATES = pd.Series(pd.to_datetime(['1677-09-22 00:00', '1900-01-01 23:59', '1969-12-31 12:00',
+                                  '1970-01-01 00:00', '2016-02-29 05:00']), name='date')
+
+
+@pytest.mark.parametrize('series', [DATES, DATES.dt.tz_localize('US/Eastern'), DATES.astype(object)],
+                         ids=['naive', 'tz', 'object'])
+def test_to_ordinal(series):
+    pd.testing.assert_series_equal(process.to_ordinal(series), loop_to_ordinal(series))
+
+
+ZFILL_COLUMNS = [pd.Series([0, 1, -5, 123456], name='int'),
+                 pd.Series([0.1, 1e16, 1e-05, np.nan, -2.5, 1 / 3], name='float'),
+                 pd.Series([True, False], name='bool'),
+                 pd.Series(['a', '12', None, 3, np.nan, ''], dtype=object, name='object'),
+                 pd.Series(['7', '7', '', '-1', 'abc'], dtype=object, name='string'),
+                 pd.Series([1, 1.0, True, '1'], dtype=object, name='mixed'),
+                 pd.Series(['x', '1'], dtype='category', name='category')]
+
+
+@pytest.mark.parametrize('width', [0, 3, 8])
+@pytest.mark.parametrize('series', ZFILL_COLUMNS, ids=[series.name for series in ZFILL_COLUMNS])
+def test_zfill(series, width):
+    pd.testing.assert_series_equal(process.zfill(series, width), loop_zfill(series, width))
+
+
+@pytest.mark.parametrize('fill_with', ['TRUE', 'FALSE', '0'])
+def test_fill_value(fill_with):
+    fill, expected = process.fill_value('col', fill_with), loop_fill(fill_with, None)
+    assert fill == expected and type(fill) is type(expected)
+
+
+@pytest.mark.parametrize('fill_with', ['', 'other'])
+def test_fill_value_unrecognized(fill_with):
+    with pytest.raises(ValueError):
+        process.fill_value('col', fill_with)
+
+
+REPLACE_COLUMNS = [pd.Series(['acme, inc', 'Foo.', None, np.nan, 1, 1.0, True, 'foo, foo', 'abab', '', 'ba', 'b'],
+                             dtype=object, name='mixed', index=list('abcdefghijkl')),
+                   pd.Series([None, np.nan], dtype=object, name='allnull'),
+                   pd.Series([1, 2, 3], dtype=object, name='ints'),
+                   pd.Series([1.5, 2.0], name='float'),
+                   pd.Series(['a, b', 'c.'], dtype='category', name='category'),
+                   pd.Series(['x, y', None], dtype=object, name='strings')]
+
+
+@pytest.mark.parametrize('regex, regex_replace', [
+    ([r',\s*', r'\.$'], [' ', '']),
+    ([r'(ab)\1', r'(?P<w>foo)'], [r'<\1>', r'\g<w>!']),
+    ([r'(?i)FOO', 'o'], ['bar', '0']),
+    ([r'a', r'b', r'ba'], ['b', 'a', 'X']),
+])
+def test_regex_group(regex, regex_replace):
+    result = process.RegexGroup(regex, regex_replace).replace(REPLACE_COLUMNS)
+    for column, replaced in zip(REPLACE_COLUMNS, result):
+        expected = column.replace(to_replace=regex, value=regex_replace, regex=True)
+        pd.testing.assert_series_equal(replaced, expected)
+        assert [type(value) for value in replaced] == [type(value) for value in expected]
+
+
+def test_compact_dtypes_object_bools():
+    flags = pd.DataFrame({'all_true': pd.Series([True, True, True], dtype=object),
+                          'mixed': pd.Series([True, False, True], dtype=object),
+                          'with_na': pd.Series([False, None, False], dtype=object),
+                          'n': [1, 2, 3]})
+    compacted, report = process.compact_dtypes(flags)
+    pd.testing.assert_frame_equal(pd.get_dummies(compacted), pd.get_dummies(flags), check_dtype=False)
+
+
+METADATA_COLUMNS = ['column_name', 'drop_rows_with_na', 'derive_to_bool', 'keep_flag', 'strip_chars', 'chars_to_strip',
+                    'date_to_ordinal', 'float_to_object', 'int_to_object', 'zfill_col', 'z', 'fill_na', 'fill_na_with',
+                    'regex_group', 'regex', 'regex_replace', 'str_to_int', 'object_to_int', 'object_to_float',
+                    'float_to_int']
+
+
+def metadata_row(column_name, **treatment):
+    row = {col: '0' for col in METADATA_COLUMNS}
+    row.update(column_name=column_name, keep_flag='1', chars_to_strip='', fill_na_with='', regex='', regex_replace='')
+    row.update(treatment)
+    return row
+
+
+@pytest.fixture
+def metadata():
+    return pd.DataFrame([
+        metadata_row('id'),
+        metadata_row('name', strip_chars='1', chars_to_strip=' ',
+                     regex_group='names', regex=r',\s* | \.$', regex_replace=' | '),
+        metadata_row('zip', float_to_object='1', zfill_col='1', z='5'),
+        metadata_row('flag', derive_to_bool='1'),
+        metadata_row('amount', regex_group='amounts', regex=',', regex_replace='', str_to_int='1'),
+        metadata_row('state', fill_na='1', fill_na_with='0',
+                     regex_group='names', regex=r',\s* | \.$', regex_replace=' | '),
+        metadata_row('date', date_to_ordinal='1'),
+        metadata_row('notes', keep_flag='0'),
+        metadata_row('key', drop_rows_with_na='1'),
+        metadata_row('count', fill_na='1', fill_na_with='0', float_to_int='1'),
+    ], columns=METADATA_COLUMNS)
+
+
+@pytest.fixture
+def raw():
+    rs = np.random.RandomState(0)
+    n = 2000
+    return pd.DataFrame({
+        'id': np.arange(n),
+        'name': rs.choice([' acme, inc ', 'foo LLC', None, ' bar corp.'], n),
+        'zip': rs.choice([123, 4567, 98765, np.nan], n),
+        'flag': rs.choice(['x', None], n),
+        'amount': rs.choice(['1,000', '25', '3,500,000'], n),
+        'state': rs.choice(['CA', 'ny', 'Tx, ', None], n),
+        'date': pd.Timestamp('2016-01-01') + pd.to_timedelta(rs.randint(0, 1000, n), unit='D'),
+        'notes': rs.rand(n),
+        'key': rs.choice(['a', 'b', None], n),
+        'count': rs.choice([1.0, 2.0, np.nan], n),
+    }, columns=['id', 'name', 'zip', 'flag', 'amount', 'state', 'date', 'notes', 'key', 'count'])
+
+
+def step_clean_data(dataframe, metadata):
+    """clean_data as it ran before the fused engine, one step function after another"""
+    tmp_df = dataframe.copy()
+    for step in [process.drop_rows_with_na, process.derive_to_bool, process.drop_columns, process.strip,
+                 process.date_to_ordinal, process.float_to_object, process.int_to_object, process.zfill_col,
+                 process.fill_na_with, process.replace, process.str_to_int, process.object_to_int,
+                 process.object_to_float, process.float_to_int]:
+        tmp_df = step(tmp_df, metadata, copy=False)
+    return tmp_df
+
+
+@pytest.mark.parametrize('maxworkers', [1, 2])
+def test_clean_data(raw, metadata, maxworkers):
+    expected = step_clean_data(raw, metadata)
+    pd.testing.assert_frame_equal(process.clean_data(raw, metadata, maxworkers=maxworkers), expected)
+    pd.testing.assert_frame_equal(process.compile_plan(metadata).execute(raw, maxworkers=maxworkers), expected)
+
+
+def test_clean_data_cache(raw, metadata, tmpdir):
+    expected = step_clean_data(raw, metadata)
+    cache = process.ColumnCache(cachedir=str(tmpdir))
+    pd.testing.assert_frame_equal(process.clean_data(raw, metadata, cache=cache), expected)
+    assert cache.hits == 0 and cache.misses > 0
+    misses = cache.misses
+    reread = raw.copy()  # equal values in distinct objects, as when the same CSV is read again
+    for col in ['name', 'flag', 'amount', 'state', 'key']:
+        reread[col] = [''.join(value) if isinstance(value, str) else value for value in raw[col]]
+    pd.testing.assert_frame_equal(process.clean_data(reread, metadata, cache=cache), expected)
+    assert cache.hits == misses and cache.misses == misses
+
+
+@pytest.mark.parametrize('column_name, treatment', [
+    ('nmae', {'strip_chars': '1', 'chars_to_strip': ' '}),
+    ('notes', {'keep_flag': '0', 'fill_na': '1', 'fill_na_with': '0'}),
+    ('flag', {'derive_to_bool': '1', 'zfill_col': '1', 'z': '3'}),
+], ids=['missing', 'dropped', 'derived'])
+def test_clean_data_unknown_column(raw, metadata, column_name, treatment):
+    metadata = pd.concat([metadata[metadata['column_name'] != column_name],
+                          pd.DataFrame([metadata_row(column_name, **treatment)], columns=METADATA_COLUMNS)],
+                         ignore_index=True)
+    with pytest.raises(KeyError):
+        step_clean_data(raw, metadata)
+    with pytest.raises(KeyError):
+        process.clean_data(raw, metadata)
+
+
+def test_column_cache_writes_index_once_per_run(raw, metadata, tmpdir, monkeypatch):
+    cache = process.ColumnCache(cachedir=str(tmpdir))
+    process.clean_data(raw, metadata, cache=cache)
+    saves = []
+    save = cache.index.save
+    monkeypatch.setattr(cache.index, 'save', lambda: saves.append(1) or save())
+    process.clean_data(raw, metadata, cache=cache)
+    assert cache.hits > 1 and len(saves) == 1
+    assert list(process.ColumnCache(cachedir=str(tmpdir)).index.entries) == list(cache.index.entries)
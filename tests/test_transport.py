@@ -0,0 +1,32 @@
+"""Checks of the cassette keys in prospecting.transport
+
+    python -m pytest tests
+"""
+from prospecting.transport import Cassette
+
+
+def batch_body(boundary, baseid, token, fileids):
+    parts = []
+    for n, fileid in enumerate(fileids, 1):
+        parts.append('--{0}\nContent-Type: application/http\nContent-Transfer-Encoding: binary\nMIME-Version: 1.0\n'
+                     'Content-ID: <{1}+{2}>\n\nGET /drive/v3/files/{3}?alt=json HTTP/1.1\n'
+                     'accept: application/json\nauthorization: Bearer {4}\n\n\n'.format(boundary, baseid, n, fileid, token))
+    return ''.join(parts) + '--{0}--'.format(boundary)
+
+
+def test_batch_key_ignores_boundary_ids_and_tokens():
+    uri = 'https://www.googleapis.com/batch/drive/v3'
+    recorded = batch_body('===============7330845974216740156==', 'b7d0c6a5-1f7a-4a51-9c8e-1c1f0a1d2e3f',
+                          'ya29.recorded', ['a', 'b'])
+    replayed = batch_body('===============1189553722164901442==', '4c2e9d8b-77b0-4e0f-8d8a-6a5f6b7c8d9e',
+                          'ya29.replayed', ['a', 'b'])
+    other = batch_body('===============1189553722164901442==', '4c2e9d8b-77b0-4e0f-8d8a-6a5f6b7c8d9e',
+                       'ya29.replayed', ['a', 'c'])
+    assert Cassette.make_key('POST', uri, recorded) == Cassette.make_key('POST', uri, replayed)
+    assert Cassette.make_key('POST', uri, recorded) != Cassette.make_key('POST', uri, other)
+
+
+def test_json_key_ignores_key_order():
+    uri = 'https://sheets.googleapis.com/v4/spreadsheets/x/values:batchUpdate'
+    assert (Cassette.make_key('POST', uri, '{"a": 1, "b": [2]}') ==
+            Cassette.make_key('POST', uri, '{"b": [2], "a": 1}'))